@@ -2,26 +2,27 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from telegram import Bot
 from telegram.ext import Dispatcher
+from telegram.utils.request import Request
 from .config import Config
-from .routes import webhook_bp
+from .routes import webhook_bp, crypto_pay_bp
 from .utils import Logger
-from .utils import TaskScheduler, keyboard, templates
-import requests
-import random
+from .utils import TaskScheduler, LeaderLock, CryptoBotAPI, QuoteBook, RestockEngine, RestockPolicy, UpdateQueue, keyboard, templates, transport
+from urllib.parse import urlsplit
+import atexit
 
 db = SQLAlchemy()
+TELEGRAM_API_HOST = "api.telegram.org"
 logger = Logger("App")
 
 def create_app():
     logger.debug("Создание приложения")
     app = Flask(__name__)
-    scheduler = TaskScheduler()
+    # Один планировщик на все фоновые задачи приложения
+    scheduler = TaskScheduler(workers=Config.SCHEDULER_WORKERS, oneshot_workers=Config.SCHEDULER_ONESHOT_WORKERS)
+    atexit.register(scheduler.stop_all, False)
     app.config['TELEGRAM_TOKEN'] = Config.TELEGRAM_TOKEN
     app.config['WEBHOOK_URL'] = Config.WEBHOOK_URL
-    app.config['SQLALCHEMY_DATABASE_URI'] \
-        = 'mysql+pymysql://{0}:{1}@{2}/{3}?charset=utf8mb4'.format(
-        Config.MYSQL_USER, Config.MYSQL_PASSWORD, Config.MYSQL_HOST, Config.MYSQL_DATABASE
-    )
+    app.config['SQLALCHEMY_DATABASE_URI'] = Config.SQLALCHEMY_DATABASE_URI
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
     app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
@@ -33,59 +34,120 @@ def create_app():
 
     db.init_app(app)
 
-    from .models import User, Product
+    from .models import Product, Order, StatusType
     with app.app_context():
         db.create_all()
 
+        # Singleton tasks (restock, invoice polling, expired orders) run in one worker process only
+        scheduler.set_leader(LeaderLock(db.engine, Config.SCHEDULER_LOCK_NAME, Config.SCHEDULER_LEASE_SECONDS),
+                             Config.SCHEDULER_LEADER_RENEW_SECONDS)
+
         keyboard.update_inline_keyboard(Product)
         logger.info("Клавиатурный конфиг успешно обновлен")
 
-        def stock_auto_update():
-            with app.app_context():
-                products = Product.query.all()
-                random_products = templates.get("vars", "stock_auto_update_is_random_products")
-                random_qty = templates.get("vars", "stock_auto_update_range_qty")
-                max_qty = templates.get("vars", "stock_auto_update_max_qty")
+    # Pending invoices of every worker process, not only the ones this process created
+    def pending_invoice_ids():
+        with app.app_context():
+            return [invoice_id for (invoice_id,) in Order.query.with_entities(Order.invoice_id)
+                    .filter_by(status=StatusType.PENDING)]
+
+    # Per-host timeouts for the pooled transport (Telegram setWebhook and Crypto Pay API)
+    transport.set_timeout(TELEGRAM_API_HOST, Config.TELEGRAM_CONNECT_TIMEOUT, Config.TELEGRAM_READ_TIMEOUT)
+
+    # Initialize shared CryptoBot client
+    crypto_bot = CryptoBotAPI(cache_ttl_minutes=templates.get("vars", "cache_ttl_minutes"),
+                              auto_cancel_default_seconds=templates.get("vars", "auto_cancel_default_seconds"),
+                              invoice_poll_seconds=templates.get("vars", "invoice_poll_seconds"),
+                              rates_max_stale_minutes=templates.get("vars", "rates_max_stale_minutes"),
+                              scheduler=scheduler,
+                              invoice_ids_source=pending_invoice_ids)
+
+    transport.set_timeout(urlsplit(crypto_bot.url).hostname,
+                          Config.CRYPTO_PAY_CONNECT_TIMEOUT, Config.CRYPTO_PAY_READ_TIMEOUT)
+
+    # Precompute asset quotes on every rate refresh
+    quote_book = QuoteBook(crypto_bot, Product)
+
+    def refresh_quotes(cache):
+        with app.app_context():
+            quote_book.refresh()
 
-                for product in products:
-                    index = product.product_id - 1
-                    if product.quantity < max_qty[index]:
-                        product.quantity += 0 if random_products and random.getrandbits(1) else (
-                            random.randint(*random_qty[index]))
+    crypto_bot.currency_cache.add_refresh_listener(refresh_quotes)
 
-                db.session.commit()
+    # Restock each product on its own schedule and redraw labels and quotes right away
+    restock_engine = RestockEngine(Product, RestockPolicy.from_config(
+        templates.get("vars", "stock_auto_update_policies")))
 
-        stock_auto_update_time = random.randint(*templates.get("vars", "stock_auto_update_range_seconds"))
-        scheduler.start_task(stock_auto_update, stock_auto_update_time, task_id="stock_auto_update")
+    def refresh_products(engine):
+        with app.app_context():
+            keyboard.update_inline_keyboard(Product)
+            quote_book.refresh()
+
+    restock_engine.add_listener(refresh_products)
+
+    def stock_auto_update():
+        with app.app_context():
+            restock_engine.tick()
+
+    scheduler.start_task(stock_auto_update, templates.get("vars", "stock_auto_update_tick_seconds"),
+                         task_id="stock_auto_update", singleton=True)
 
     # Initialize Telegram bot
-    bot = Bot(token=app.config['TELEGRAM_TOKEN'])
+    # Пул соединений на каждый воркер обработки обновлений плюс фоновые задачи
+    bot = Bot(token=app.config['TELEGRAM_TOKEN'],
+              request=Request(con_pool_size=Config.UPDATE_WORKERS + 4,
+                              connect_timeout=Config.TELEGRAM_CONNECT_TIMEOUT,
+                              read_timeout=Config.TELEGRAM_READ_TIMEOUT))
 
     # Initialize Dispatcher
     dispatcher = Dispatcher(bot, None, workers=0)
 
     # Setup handlers
-    from .bot import setup_handlers
+    from .bot import setup_handlers, setup_payment_listener, setup_expired_orders_job
     setup_handlers(dispatcher)
 
-    # Register webhook blueprint
+    # Initialize update queue
+    update_queue = None
+    if Config.WEBHOOK_MODE == "queue":
+        def process_update(update):
+            with app.app_context():
+                dispatcher.process_update(update)
+
+        update_queue = UpdateQueue(process_update,
+                                   workers=Config.UPDATE_WORKERS,
+                                   maxsize=Config.UPDATE_QUEUE_SIZE,
+                                   enqueue_timeout=Config.UPDATE_ENQUEUE_TIMEOUT)
+        update_queue.start()
+        atexit.register(update_queue.stop, Config.UPDATE_DRAIN_TIMEOUT)
+
+    # Register webhook blueprints
     app.register_blueprint(webhook_bp)
+    app.register_blueprint(crypto_pay_bp)
 
     # Store bot and dispatcher
     app.bot = bot
     app.dispatcher = dispatcher
+    app.crypto_bot = crypto_bot
+    app.quote_book = quote_book
+    app.update_queue = update_queue
+
+    # Confirm orders as soon as CryptoBot reports payment
+    setup_payment_listener(app)
+
+    # Release stock held by abandoned orders, including ones left over from a restart
+    setup_expired_orders_job(app, scheduler)
 
-    # Set webhook using requests
-    logger.debug(f"Установка веб-хука на {app.config['WEBHOOK_URL']}")
+    # Set webhook using pooled transport
+    logger.debug("Установка веб-хука на %s", app.config['WEBHOOK_URL'])
     webhook_url = app.config['WEBHOOK_URL']
-    response = requests.post(
-        f"https://api.telegram.org/bot{app.config['TELEGRAM_TOKEN']}/setWebhook",
+    response = transport.post(
+        f"https://{TELEGRAM_API_HOST}/bot{app.config['TELEGRAM_TOKEN']}/setWebhook",
         json={"url": webhook_url}
     )
     if response.status_code == 200:
         logger.info("Веб-хук успешно установлен")
     else:
-        logger.warning("Ошибка при установке веб-хука: {response.text}")
+        logger.warn(f"Ошибка при установке веб-хука: {response.text}")
 
     logger.info("Приложение успешно создано")
 
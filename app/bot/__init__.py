@@ -1 +1,3 @@
-from .handlers import setup_handlers
\ No newline at end of file
+from .handlers import setup_handlers
+from .payments import setup_payment_listener
+from .expired_orders import setup_expired_orders_job
@@ -1,11 +1,10 @@
-import json
 import logging
-from telegram import KeyboardButton, ReplyKeyboardMarkup, ReplyKeyboardRemove, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import ReplyKeyboardMarkup, InlineKeyboardMarkup
 from telegram.parsemode import ParseMode
 from telegram.message import Message
 from flask import current_app as app
-from app.utils import Logger, keyboard
-from app.models import Product, User, Order, StatusType
+from app.utils import Logger, Lazy, keyboard
+from app.models import Product, choice_store, user_identity, active_orders
 from enum import Enum
 
 logger = Logger("BaseContext")
@@ -27,9 +26,7 @@ class BaseContext:
         self.username = username if username else f"unknown_{self.user_id}"
         self.chat_id = self.message.chat_id
 
-        self._user = None
-        self._past_order = None
-
+        self._choice_state = None
         self._parse_mode = ParseMode.HTML
         self._disable_web_page_preview = True
 
@@ -57,14 +54,12 @@ class BaseContext:
         params["user_id"] = self.user_id
         params["chat_id"] = self.chat_id
 
-        data_pattern = " ".join([
-            f"{k}[{v}]" for k, v in list(params.items())[::-1] if k != "text"
-        ])
+        # Поля лога собираются в строку, только если запись будет выведена
+        fields = Lazy(self._log_fields, params)
         message = None
 
-        if logger.level == logging.DEBUG:
-            text_pattern = f"text[\"{params['text']}\"]" if 'text' in params else ''
-            logger.debug(f"Выполнение команды {method}: {data_pattern} {text_pattern}")
+        if logger.is_enabled_for(logging.DEBUG):
+            logger.debug("Выполнение команды %s: %s text[\"%s\"]", method, fields, params.get("text", ""))
 
         try:
             match method:
@@ -85,12 +80,16 @@ class BaseContext:
                         disable_web_page_preview=self._disable_web_page_preview,
                         reply_markup=params["reply_markup"])
 
-            logger.info(f"Успешное выполнение команды {method}: {data_pattern}")
+            logger.info("Успешное выполнение команды %s: %s", method, fields)
             return message if message else True
         except Exception as e:
-            logger.error(f"Ошибка при выполнении команды {method}: {data_pattern}: {e}")
+            logger.error("Ошибка при выполнении команды %s: %s: %s", method, fields, e)
             raise e
 
+    @staticmethod
+    def _log_fields(params: dict) -> str:
+        return " ".join(f"{k}[{v}]" for k, v in reversed(params.items()) if k != "text")
+
     def send_message(self, text, reply_markup = None) -> Message:
         """Отправляет сообщение пользователю. Если задан reply_markup, то создает клавиатуру"""
         logger.log_function_call("BaseContext.send_message")
@@ -113,7 +112,7 @@ class BaseContext:
                              message_id=message_id, text=text, reply_markup=reply_markup)
 
     @staticmethod
-    def get_keyboard(key_data:list[list] or list[dict]) -> ReplyKeyboardMarkup or InlineKeyboardMarkup:
+    def get_keyboard(key_data:list[list] or list[dict], urls: dict = None) -> ReplyKeyboardMarkup or InlineKeyboardMarkup:
         if isinstance(key_data[0], list):
             return ReplyKeyboardMarkup(
                 keyboard=key_data,
@@ -121,99 +120,37 @@ class BaseContext:
                 one_time_keyboard=False
             )
 
-        max_row_p = 0
-        max_row_n = 0
-        for key in key_data:
-            row = key["position"]["row"]
-            if row > max_row_p:
-                max_row_p = row
-            elif row < 0 and abs(row) > max_row_n:
-                max_row_n = abs(row)
-
-        keyboard = [[] for i in range(max_row_p)]
-        bottom_keys = [[] for i in range(max_row_n)]
-
-        for key in key_data:
-            row = key["position"]["row"]
-            column = key["position"]["column"]
-            inline_key = InlineKeyboardButton(key["text"], callback_data=json.dumps(key["callback_data"]))
-
-            if row < 0:
-                bottom_keys[abs(row) - 1].insert(abs(column) - 1, inline_key)
-                continue
-
-            keyboard[row - 1].insert(column - 1, inline_key)
-
-        for bottom_key in bottom_keys:
-            keyboard.append(bottom_key)
-
-        return InlineKeyboardMarkup(keyboard)
+        return keyboard.build_inline_markup(key_data, urls)
 
     @property
     def general_keyboard(self):
-        logger.debug(keyboard.general)
-        return self.get_keyboard(keyboard.general)
+        return keyboard.general_markup
 
-    def get_inline_keyboard(self, actions: list, urls: dict = None):
+    def get_inline_keyboard(self, actions: list, urls: dict = None, labels: dict = None):
         keyboard.update_inline_keyboard(Product)
-        keys = [key for key in keyboard.inline
-                if key["callback_data"]["action"] in actions]
-
-        logger.debug(keys)
-        return self.get_keyboard(keys, urls)
+        return keyboard.get_inline_markup(actions, urls, labels)
 
     def _create_user(self) -> None:
         """Получает или создаёт пользователя в базе данных."""
         logger.log_function_call("BaseContext._create_user")
-        user = User.query.get(self.user_id)
-
-        if user is None:
-
-            logger.info(f"Создание нового пользователя: user_id[{self.user_id}] username[\"{self.username}\"]")
-            user = User(
-                username=self.username,
-                user_id=self.user_id,
-            )
-            try:
-                user.save()
-                logger.info(f"Новый пользователь успешно создан: "
-                            f"user_id[{self.user_id}] username[\"{self.username}\"]")
-            except Exception as e:
-                logger.error(f"Ошибка создания пользователя: {e}")
-                raise
-
-        self._user = user
+        user_identity.ensure(self.user_id, self.username)
 
     @property
     def past_order(self):
-        if not self._past_order:
-            query = Order.query.order_by(Order.order_id.desc())
-            order = query.filter_by(user_id = self._user.user_id,
-                                    status  = StatusType.PENDING).first()
-
-            self._past_order = order
-
-        return self._past_order if self._past_order else None
+        """Ожидающий оплаты заказ пользователя (ActiveOrder) или None"""
+        return active_orders.get(self.user_id)
 
     @property
     def _choice(self):
-        choices = self._user.choice.split("/")
-        check_index = lambda index: 0 <= index + 1 < len(choices)
-
-        product_id = int(choices[0].split("?")[1]) if check_index(0) else None
-        qty_id = int(choices[1].split("?")[1]) if check_index(1) else None
-        asset_id = int(choices[2].split("?")[1]) if check_index(2) else None
-
-        return product_id, qty_id, asset_id
-
-    def choice_update(self, stage, choices, action, action_id):
-        if stage == 1:
-            if self._user.choice:
-                self._user.choice = ""
-        else:
-            if len(choices) >= stage:
-                self._user.choice = "/".join(choices[:-1]) + "/"
-        self._user.choice += f"{action}?{action_id}/"
-        self._user.commit()
+        # Строка читается один раз за обновление, свои записи накладываются на нее в памяти
+        if self._choice_state is None:
+            self._choice_state = choice_store.get(self.user_id)
+        state = self._choice_state
+        return state.product_id, state.qty, state.asset_id
+
+    def choice_update(self, stage, action_id):
+        row = choice_store.set_stage(self.user_id, stage, int(action_id))
+        if self._choice_state is not None:
+            self._choice_state = self._choice_state.apply_row(row)
 
 __all__ = ['BaseContext']
\ No newline at end of file
@@ -1,7 +1,8 @@
 import json
+from flask import current_app as app
 from .base_context import BaseContext
-from app.utils import Logger, CryptoBotAPI, templates, keyboard
-from app.models import Product, Order, StatusType
+from app.utils import Logger, templates, keyboard
+from app.models import Product, Order, StatusType, ActiveOrder, active_orders
 
 logger = Logger("YSContext")
 
@@ -10,8 +11,7 @@ class YSContext(BaseContext):
         super().__init__(update)
 
         self._create_user()
-        self.crypto_bot = CryptoBotAPI(cache_ttl_minutes=templates.get("vars", "cache_ttl_minutes"),
-                                       auto_cancel_default_seconds=templates.get("vars", "auto_cancel_default_seconds"))
+        self.crypto_bot = app.crypto_bot
         self.support_username = templates.get("vars", "support_username")
 
 
@@ -105,35 +105,65 @@ class YSContext(BaseContext):
             logger.error(f"Товар с идентификатором {product_id} не найден")
             return None
 
-        self.check_payment()
-        self.cancel_order()
+        # Ожидающий заказ ищем по индексу в обход кэша: его мог создать другой воркер
+        if active_orders.refresh(self.user_id):
+            self.check_payment()
+            self.cancel_order()
 
         price_in_rub = product.price * quantity
         time_to_pay = str(round(int(templates.get("vars", "auto_cancel_default_seconds")) / 60))
 
-        price_in_asset = self.crypto_bot.convert_amount(price_in_rub, "RUB", type_of_asset)
+        price_in_asset = (app.quote_book.get(product_id, quantity, type_of_asset, price=product.price)
+                          or self.crypto_bot.convert_amount(price_in_rub, "RUB", type_of_asset))
         if not price_in_asset:
             logger.error(f"Валюта {type_of_asset} не найдена")
             return None
 
         new_invoice = self.crypto_bot.create_invoice(asset=type_of_asset, amount=price_in_asset)
+        if new_invoice is None:
+            logger.error(f"Не удалось создать инвойс для товара {product_id}")
+            return None
+
+        # Резерв, заказ и выбор пользователя — одним коммитом
+        try:
+            with Order.unit_of_work() as uow:
+                if not Product.reserve(product_id, quantity):
+                    uow.cancel()
+                else:
+                    new_order = Order.priced(
+                        unit_price   = product.price,
+                        quantity     = quantity,
+                        asset        = type_of_asset,
+                        asset_amount = price_in_asset,
+                        user_id      = self.user_id,
+                        product_id   = product_id,
+                        invoice_id   = new_invoice.invoice_id,
+                        message_id   = message_id
+                    )
+                    new_order.save()
+                    active_order = ActiveOrder.from_order(new_order)
+                    account_limit = product.account_limit
+                    uow.after_commit(active_orders.set, self.user_id, active_order)
+        except RuntimeError:
+            self.crypto_bot.delete_invoice(new_invoice.invoice_id)
+            raise
+
+        if uow.cancelled:
+            self.crypto_bot.delete_invoice(new_invoice.invoice_id)
+            text = templates.get("bot", "insufficient_quantity",
+                                 quantity = quantity,
+                                 available_quantity = Product.query.get(product_id).quantity,
+                                 support_username = self.support_username)
 
-        new_order = Order(
-            user       = self._user,
-            product    = product,
-            quantity   = quantity,
-            invoice_id = new_invoice.invoice_id,
-            message_id = message_id
-        )
-        product.quantity -= quantity
-        product.commit()
-        new_order.save()
+            self.edit_message_text(message_id, text, reply_markup=
+            self.get_inline_keyboard(["back_to_qty"]))
+            return None
 
-        logger.info(f"Заказ #{new_order.order_id} успешно создан на общую сумму {price_in_rub}р")
+        logger.info(f"Заказ #{active_order.order_id} успешно создан на общую сумму {price_in_rub}р")
 
         kwargs = {
-            "order_id"          : new_order.order_id,
-            "acc_limit"         : product.account_limit,
+            "order_id"          : active_order.order_id,
+            "acc_limit"         : account_limit,
             "quantity"          : quantity,
             "price_in_rub"      : price_in_rub,
             "type_of_asset"     : type_of_asset,
@@ -146,53 +176,83 @@ class YSContext(BaseContext):
         self.edit_message_text(message_id, text, reply_markup =
         self.get_inline_keyboard(actions=["select_order_action"], urls = { "1" : new_invoice.pay_url }))
 
-    def cancel_order(self):
-        logger.log_function_call("YSContext.cancel_order")
-
-        if not self.past_order:
-            return
+    def _fresh_order(self, stale: ActiveOrder):
+        """Перечитывает ожидающий заказ в обход кэша, когда указатель на stale оказался устаревшим.
 
-        self.past_order.status = StatusType.CANCELLED
-        self.past_order.product.quantity += self.past_order.quantity
-        self.past_order.commit()
+        Returns:
+            ActiveOrder or None: Другой ожидающий заказ пользователя, если он есть.
+        """
+        fresh = active_orders.refresh(self.user_id)
+        return fresh if fresh and fresh.order_id != stale.order_id else None
 
-        self.crypto_bot.delete_invoice(self.past_order.invoice_id)
-        logger.info(f"Заказ #{self.past_order.order_id} успешно отменен")
+    def cancel_order(self, order = None, retry = True):
+        logger.log_function_call("YSContext.cancel_order")
 
-        self.edit_message_text(self.past_order.message_id, templates.get("bot", "cancel_order",
-                                                         order_id = self.past_order.order_id,
-                                                         support_username = self.support_username))
+        order = order or self.past_order
+        if not order:
+            return
 
-    def successful_payment(self):
+        active_orders.clear(self.user_id, order.order_id)
+        # Статус и возврат остатка — одним коммитом, удаление инвойса и сообщение — после него
+        with Order.unit_of_work() as uow:
+            if not Order.transition(order.order_id, StatusType.CANCELLED):
+                uow.cancel()
+            else:
+                Product.release(order.product_id, order.quantity)
+
+                uow.after_commit(self.crypto_bot.delete_invoice, order.invoice_id)
+                uow.after_commit(logger.info, f"Заказ #{order.order_id} успешно отменен")
+                uow.after_commit(self.edit_message_text, order.message_id,
+                                 templates.get("bot", "cancel_order",
+                                               order_id = order.order_id,
+                                               support_username = self.support_username))
+
+        # Указатель мог устареть: заказ уже закрыт, а ожидающим стал другой
+        if uow.cancelled and retry:
+            fresh = self._fresh_order(order)
+            if fresh:
+                self.cancel_order(fresh, retry=False)
+
+    def successful_payment(self, order = None):
         logger.log_function_call("YSContext.successful_payment")
 
-        if not self.past_order:
+        order = order or self.past_order
+        if not order:
             return
 
-        self.past_order.status = StatusType.PAID
-        self.past_order.commit()
+        active_orders.clear(self.user_id, order.order_id)
+        if not Order.transition(order.order_id, StatusType.PAID):
+            return
 
-        logger.info(f"Заказ #{self.past_order.order_id} успешно оплачен: "
-                    f"user_id[{self.past_order.user_id}] "
+        logger.info(f"Заказ #{order.order_id} успешно оплачен: "
+                    f"user_id[{self.user_id}] "
                     f"username[\"{self.username}\"]"
-                    f"total_amount[{self.past_order.total_price}]")
+                    f"total_amount[{order.total_price}]")
 
-        self.edit_message_text(self.past_order.message_id, templates.get("bot", "successful_payment",
-                                                         order_id=self.past_order.order_id,
+        self.edit_message_text(order.message_id, templates.get("bot", "successful_payment",
+                                                         order_id=order.order_id,
                                                          support_username = self.support_username))
 
     def check_payment(self):
         logger.log_function_call("YSContext.check_payment")
 
-        if not self.past_order:
+        order = self.past_order
+        if not order:
             return
 
-        result = self.crypto_bot.check_invoice_paid(self.past_order.invoice_id)
+        # Пользователь ждет ответа прямо сейчас: спрашиваем API, а не локальный статус
+        result = self.crypto_bot.check_invoice_paid(order.invoice_id, update_from_api=True)
+        if not result:
+            # Указатель мог устареть: проверяем заказ, который сейчас ожидает оплаты
+            fresh = self._fresh_order(order)
+            if fresh:
+                order = fresh
+                result = self.crypto_bot.check_invoice_paid(order.invoice_id, update_from_api=True)
 
         if result:
-            self.successful_payment()
+            self.successful_payment(order)
         elif result is None:
-            self.cancel_order()
+            self.cancel_order(order)
 
         return result
 
@@ -200,8 +260,13 @@ class YSContext(BaseContext):
         logger.log_function_call("YSContext.select_asset")
         text = templates.get("bot", "select_asset")
 
+        product_id, quantity, _ = self._choice
+        quotes = app.quote_book.get_for_assets(product_id, quantity)
+        labels = {asset_id: templates.get("bot", "asset_label", asset=asset, amount=f"{quotes[asset]:.6g}")
+                  for asset_id, asset in keyboard.asset_options.items() if asset in quotes}
+
         self.edit_message_text(message_id, text, reply_markup
-        = self.get_inline_keyboard(actions=["select_asset", "back_to_qty"]))
+        = self.get_inline_keyboard(actions=["select_asset", "back_to_qty"], labels=labels))
 
     def handle(self):
         """Обрабатывает команду пользователя.
@@ -269,21 +334,17 @@ class YSContext(BaseContext):
         json_data = json.loads(cb_data)
         action = json_data["action"]
         action_id = json_data["id"] if "id" in json_data else None
-        choices = 0
-
-        if action != "select_order":
-            choices = self._user.choice.split("/")[:-1]
 
         match action:
             case "select_order":
-                self.choice_update(1, choices, action, action_id)
+                self.choice_update(1, action_id)
                 self.select_qty(message_id)
             case "select_qty":
-                self.choice_update(2, choices, action, action_id)
+                self.choice_update(2, action_id)
                 if self.check_product_qty(message_id):
                     self.select_asset(message_id)
             case "select_asset":
-                self.choice_update(3, choices, action, action_id)
+                self.choice_update(3, action_id)
                 self.set_order(message_id)
             case "back_to_product":
                 self.get_product(message_id)
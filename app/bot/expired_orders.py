@@ -0,0 +1,123 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from telegram.parsemode import ParseMode
+from app.models import Order, Product, StatusType, active_orders
+from app.utils import Logger, templates
+from .payments import confirm_payment
+
+logger = Logger("ExpiredOrders")
+
+def _expired_orders(expire_after: int, after_id: int, limit: int):
+    """Ищет просроченные PENDING заказы по индексу (status, order_date) без блокировок.
+
+    Срок считается в Python по UTC, как и order_date новых заказов, а не
+    функциями даты конкретной СУБД.
+    """
+    deadline = datetime.utcnow() - timedelta(seconds=expire_after)
+    return (Order.query
+            .with_entities(Order.order_id, Order.invoice_id)
+            .filter(Order.status == StatusType.PENDING,
+                    Order.order_date < deadline,
+                    Order.order_id > after_id)
+            .order_by(Order.order_id)
+            .limit(limit)
+            .all())
+
+def _cancel_chunk(app, order_ids) -> int:
+    """Отменяет пачку заказов одной транзакцией, внешние действия выполняет после коммита"""
+    with Order.unit_of_work() as uow:
+        # Строки, занятые оплатой или отменой пользователем, пропускаем до следующего прохода
+        orders = (Order.query
+                  .with_entities(Order.order_id, Order.user_id, Order.product_id,
+                                 Order.invoice_id, Order.message_id, Order.quantity)
+                  .filter(Order.order_id.in_(order_ids), Order.status == StatusType.PENDING)
+                  .with_for_update(skip_locked=True)
+                  .all())
+        if not orders:
+            uow.cancel()
+            return 0
+
+        Order.query.filter(Order.order_id.in_([order.order_id for order in orders])) \
+            .update({Order.status: StatusType.CANCELLED}, synchronize_session=False)
+
+        released = Counter()
+        for order in orders:
+            released[order.product_id] += order.quantity
+        Product.release_many(dict(released))
+
+        uow.after_commit(_after_cancel, app, orders)
+    return len(orders)
+
+def _after_cancel(app, orders):
+    for order in orders:
+        active_orders.clear(order.user_id, order.order_id)
+
+    app.crypto_bot.delete_invoices([order.invoice_id for order in orders])
+
+    support_username = templates.get("vars", "support_username")
+    for order in orders:
+        logger.info(f"Заказ #{order.order_id} отменен по истечении срока оплаты")
+        try:
+            # В личных чатах chat_id совпадает с user_id
+            app.bot.edit_message_text(chat_id=order.user_id, message_id=order.message_id,
+                                      text=templates.get("bot", "cancel_order",
+                                                         order_id=order.order_id,
+                                                         support_username=support_username),
+                                      parse_mode=ParseMode.HTML,
+                                      disable_web_page_preview=True)
+        except Exception as e:
+            logger.error(f"Ошибка уведомления об отмене заказа #{order.order_id}: {e}")
+
+def cancel_expired_orders(app, expire_after: int, chunk_size: int = 100, max_chunks: int = 20) -> int:
+    """Отменяет просроченные неоплаченные заказы и возвращает их товар в остаток.
+
+    Заказы обрабатываются пачками по chunk_size, каждая пачка — короткая
+    транзакция. Перед отменой статусы инвойсов пачки запрашиваются в API:
+    оплаченные в последний момент заказы подтверждаются, а не отменяются.
+
+    Returns:
+        int: Количество отмененных заказов.
+    """
+    cancelled = 0
+    after_id = 0
+    for _ in range(max_chunks):
+        rows = _expired_orders(expire_after, after_id, chunk_size)
+        if not rows:
+            break
+        after_id = rows[-1].order_id
+
+        invoices = app.crypto_bot.fetch_invoices([row.invoice_id for row in rows])
+        if invoices is None:
+            logger.warn(f"Не удалось проверить инвойсы {len(rows)} просроченных заказов, отмена отложена")
+            break
+        paid = {invoice.invoice_id for invoice in invoices if invoice.status == "paid"}
+        # Оплаченные подтверждаем здесь же, до блокировки строк; при ошибке заказ
+        # остается в PENDING и не отменяется, следующий проход попробует снова
+        for invoice_id in paid:
+            try:
+                confirm_payment(app, invoice_id)
+            except Exception as e:
+                logger.error(f"Ошибка подтверждения оплаты инвойса {invoice_id}: {e}")
+        order_ids = [row.order_id for row in rows if row.invoice_id not in paid]
+        if order_ids:
+            cancelled += _cancel_chunk(app, order_ids)
+
+        if len(rows) < chunk_size:
+            break
+
+    if cancelled:
+        logger.info(f"Отменено просроченных заказов: {cancelled}")
+    return cancelled
+
+def setup_expired_orders_job(app, scheduler):
+    """Запускает периодическую отмену просроченных заказов"""
+    expire_after = (int(templates.get("vars", "auto_cancel_default_seconds"))
+                    + int(templates.get("vars", "expired_orders_grace_seconds")))
+    chunk_size = int(templates.get("vars", "expired_orders_chunk_size"))
+
+    def job():
+        with app.app_context():
+            cancel_expired_orders(app, expire_after, chunk_size)
+
+    scheduler.start_task(job, templates.get("vars", "expired_orders_check_seconds"), task_id="expired_orders",
+                         singleton=True)
@@ -0,0 +1,56 @@
+from telegram.parsemode import ParseMode
+from app.models import Order, StatusType, active_orders
+from app.utils import Logger, templates
+
+logger = Logger("Payments")
+
+def confirm_payment(app, invoice_id: int) -> bool:
+    """Отмечает заказ по инвойсу оплаченным и сообщает об этом пользователю.
+
+    Вызов идемпотентен: для уже подтвержденного или отмененного заказа
+    ничего не делает, поэтому его можно повторять при каждом статусе "paid".
+
+    Returns:
+        bool: False, если ожидающего оплаты заказа с таким инвойсом нет.
+
+    Raises:
+        RuntimeError: Если статус заказа не удалось записать.
+    """
+    order = Order.query.filter_by(invoice_id=invoice_id, status=StatusType.PENDING).first()
+    if order is None:
+        return False
+
+    active_orders.clear(order.user_id, order.order_id)
+    if not Order.transition(order.order_id, StatusType.PAID):
+        return False
+
+    logger.info(f"Заказ #{order.order_id} успешно оплачен: "
+                f"user_id[{order.user_id}] invoice_id[{invoice_id}] total_amount[{order.total_price}]")
+
+    try:
+        # В личных чатах chat_id совпадает с user_id
+        app.bot.edit_message_text(chat_id=order.user_id, message_id=order.message_id,
+                                  text=templates.get("bot", "successful_payment",
+                                                     order_id=order.order_id,
+                                                     support_username=templates.get("vars", "support_username")),
+                                  parse_mode=ParseMode.HTML,
+                                  disable_web_page_preview=True)
+    except Exception as e:
+        logger.error(f"Ошибка уведомления об оплате заказа #{order.order_id}: {e}")
+    return True
+
+def setup_payment_listener(app):
+    """Подтверждает заказы по каждому статусу "paid" из веб-хука и опроса.
+
+    Решение принимается по текущему состоянию, а не по смене локального
+    статуса: если прошлое подтверждение не удалось, следующий опрос или
+    повтор веб-хука найдет заказ все еще в PENDING и подтвердит его.
+    """
+
+    def on_invoice_status(invoice, previous_status):
+        if invoice.status != "paid":
+            return
+        with app.app_context():
+            confirm_payment(app, invoice.invoice_id)
+
+    app.crypto_bot.invoice_manager.add_listener(on_invoice_status)
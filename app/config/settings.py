@@ -13,4 +13,43 @@ class Config:
     MYSQL_USER = os.getenv("MYSQL_USER")
     MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD")
     LOGS_DIR_PATH= os.getenv("LOGS_DIR_PATH")
-    CRYPTO_BOT_TOKEN = os.getenv("CRYPTO_BOT_TOKEN")
\ No newline at end of file
+    CRYPTO_BOT_TOKEN = os.getenv("CRYPTO_BOT_TOKEN")
+
+    SQLALCHEMY_DATABASE_URI = 'mysql+pymysql://{0}:{1}@{2}/{3}?charset=utf8mb4'.format(
+        MYSQL_USER, MYSQL_PASSWORD, MYSQL_HOST, MYSQL_DATABASE
+    )
+
+    # Обработка обновлений Telegram: "sync" — в потоке запроса, "queue" — через очередь и пул воркеров
+    WEBHOOK_MODE = os.getenv("WEBHOOK_MODE", "queue")
+    UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", 4))
+    UPDATE_QUEUE_SIZE = int(os.getenv("UPDATE_QUEUE_SIZE", 1000))
+    UPDATE_ENQUEUE_TIMEOUT = float(os.getenv("UPDATE_ENQUEUE_TIMEOUT", 0.5))
+    UPDATE_DRAIN_TIMEOUT = float(os.getenv("UPDATE_DRAIN_TIMEOUT", 30))
+
+    # HTTP-клиент для Crypto Pay и Telegram
+    HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 16))
+    HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", 2))
+    HTTP_BACKOFF_SECONDS = float(os.getenv("HTTP_BACKOFF_SECONDS", 0.3))
+    HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 3.05))
+    HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 10))
+    # Таймауты по хостам: Telegram отвечает быстро, Crypto Pay на создании инвойса — дольше
+    TELEGRAM_CONNECT_TIMEOUT = float(os.getenv("TELEGRAM_CONNECT_TIMEOUT", HTTP_CONNECT_TIMEOUT))
+    TELEGRAM_READ_TIMEOUT = float(os.getenv("TELEGRAM_READ_TIMEOUT", 5))
+    CRYPTO_PAY_CONNECT_TIMEOUT = float(os.getenv("CRYPTO_PAY_CONNECT_TIMEOUT", HTTP_CONNECT_TIMEOUT))
+    CRYPTO_PAY_READ_TIMEOUT = float(os.getenv("CRYPTO_PAY_READ_TIMEOUT", HTTP_READ_TIMEOUT))
+
+    # Фоновые задачи: периодические джобы, таймеры отмены инвойсов, обновление курсов
+    SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", 4))
+    # Отдельный пул однократных задач (таймеры отмены инвойсов), чтобы они не занимали периодические
+    SCHEDULER_ONESHOT_WORKERS = int(os.getenv("SCHEDULER_ONESHOT_WORKERS", 4))
+    # Задачи с singleton=True выполняет только один процесс: GET_LOCK в MySQL, аренда в таблице для других СУБД
+    SCHEDULER_LOCK_NAME = os.getenv("SCHEDULER_LOCK_NAME", "yandex_split:scheduler")
+    SCHEDULER_LEADER_RENEW_SECONDS = float(os.getenv("SCHEDULER_LEADER_RENEW_SECONDS", 15))
+    SCHEDULER_LEASE_SECONDS = float(os.getenv("SCHEDULER_LEASE_SECONDS", 45))
+
+    # Уровни логов: общий и по именам логгеров, например LOG_LEVELS="CryptoBotAPI=DEBUG,Handlers=WARNING"
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_LEVELS = {
+        name.strip(): level.strip().upper()
+        for name, level in (item.split("=", 1) for item in os.getenv("LOG_LEVELS", "").split(",") if "=" in item)
+    }
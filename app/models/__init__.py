@@ -2,5 +2,8 @@ from .base_model import Base
 from .user_model import User
 from .order_model import Order, StatusType
 from .product_model import Product
+from .user_state import ChoiceState, choice_store
+from .user_identity import user_identity
+from .active_order import ActiveOrder, active_orders
 
-__all__ = ["User", "Base", "Product", "Order", "StatusType"]
\ No newline at end of file
+__all__ = ["User", "Base", "Product", "Order", "StatusType", "ChoiceState", "choice_store", "user_identity", "ActiveOrder", "active_orders"]
\ No newline at end of file
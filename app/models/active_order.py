@@ -0,0 +1,104 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Dict, Optional, Tuple
+from app.models.order_model import Order, StatusType
+from app.utils import Logger
+
+logger = Logger("ActiveOrders")
+
+@dataclass(frozen=True)
+class ActiveOrder:
+    """Неоплаченный заказ пользователя"""
+    order_id: int
+    invoice_id: int
+    message_id: int
+    product_id: int
+    quantity: int
+    total_price: Decimal
+
+    @classmethod
+    def from_order(cls, order: Order) -> "ActiveOrder":
+        return cls(order.order_id, order.invoice_id, order.message_id,
+                   order.product_id, order.quantity, order.total_price)
+
+
+class ActiveOrderCache:
+    """Указатель на ожидающий оплаты заказ для каждого пользователя.
+
+    Кэшируется только найденный заказ: он обновляется при создании, оплате и
+    отмене, а смена статуса выполняется условным UPDATE, так что устаревший
+    указатель ни к чему не приводит: если переход не удался, вызывающий
+    перечитывает заказ через refresh() и повторяет действие. Отсутствие заказа не кэшируется — заказ
+    мог создать другой воркер, поэтому промах всегда идет в БД по индексу
+    (user_id, status, order_id).
+    """
+
+    def __init__(self, max_size: int = 10000, ttl_seconds: float = 300):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.entries: "OrderedDict[int, Tuple[ActiveOrder, float]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int) -> Optional[ActiveOrder]:
+        """Возвращает ожидающий оплаты заказ пользователя, при промахе читает его из БД"""
+        cached = self._lookup(user_id)
+        if cached is not None:
+            return cached
+        return self.refresh(user_id)
+
+    def refresh(self, user_id: int) -> Optional[ActiveOrder]:
+        """Читает ожидающий оплаты заказ из БД в обход кэша и обновляет указатель"""
+        order = Order.query.filter_by(user_id=user_id, status=StatusType.PENDING) \
+            .order_by(Order.order_id.desc()).first()
+        active = ActiveOrder.from_order(order) if order else None
+        self.set(user_id, active)
+        return active
+
+    def _lookup(self, user_id: int) -> Optional[ActiveOrder]:
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry and entry[1] > now:
+                self.entries.move_to_end(user_id, last=True)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return None
+
+    def set(self, user_id: int, order: Optional[ActiveOrder]):
+        with self.lock:
+            if order is None:
+                self.entries.pop(user_id, None)
+                return
+            self.entries[user_id] = (order, time.monotonic() + self.ttl_seconds)
+            self.entries.move_to_end(user_id, last=True)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self, user_id: int, order_id: int):
+        """Сбрасывает указатель, если он все еще указывает на заказ order_id"""
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry and entry[0].order_id == order_id:
+                del self.entries[user_id]
+
+    def forget(self, user_id: int):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def stats(self) -> Dict[str, float]:
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+active_orders = ActiveOrderCache()
@@ -1,6 +1,7 @@
 from app import db
-from sqlalchemy.dialects.mysql import INTEGER, BIGINT, VARCHAR, ENUM, DATETIME
+from sqlalchemy.dialects.mysql import TINYINT, SMALLINT, INTEGER, BIGINT, VARCHAR, ENUM, DATETIME
 from app.utils import Logger
+from contextlib import contextmanager
 from enum import Enum
 
 logger = Logger("BaseModel")
@@ -10,9 +11,88 @@ class BaseMethod(Enum):
     DELETE = 1
     COMMIT = 2
 
+class UnitOfWork:
+    """Открытая транзакция и очередь действий, выполняемых после её коммита"""
+
+    SESSION_KEY = "unit_of_work"
+
+    def __init__(self):
+        self.outbox = []
+        self.cancelled = False
+
+    def after_commit(self, callback, *args):
+        self.outbox.append((callback, args))
+
+    def cancel(self):
+        """Откатывает транзакцию при выходе из блока вместо коммита"""
+        self.cancelled = True
+
+    def run_outbox(self):
+        for callback, args in self.outbox:
+            try:
+                callback(*args)
+            except Exception as e:
+                logger.error(f"Ошибка действия после коммита {getattr(callback, '__name__', callback)}: {e}")
+
+
 class Base(db.Model):
     __abstract__ = True
 
+    @classmethod
+    @contextmanager
+    def unit_of_work(cls):
+        """Объединяет операции с БД в одну транзакцию.
+
+        Внутри блока save(), commit(), delete() и атомарные UPDATE моделей
+        только сбрасывают изменения в БД, а коммит выполняется один раз при
+        выходе. Действия из after_commit() выполняются после коммита и
+        отбрасываются при откате. Вложенный блок присоединяется к внешнему.
+
+        Raises:
+            RuntimeError: Если коммит не удался.
+        """
+        session = db.session
+        current = session.info.get(UnitOfWork.SESSION_KEY)
+        if current is not None:
+            yield current
+            return
+
+        uow = session.info[UnitOfWork.SESSION_KEY] = UnitOfWork()
+        try:
+            yield uow
+            if uow.cancelled:
+                session.rollback()
+            else:
+                session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Ошибка транзакции: {e}")
+            if isinstance(e, RuntimeError):
+                raise
+            raise RuntimeError(f"Error in unit of work: {e}") from e
+        finally:
+            session.info.pop(UnitOfWork.SESSION_KEY, None)
+
+        if not uow.cancelled:
+            uow.run_outbox()
+
+    @staticmethod
+    def after_commit(callback, *args):
+        """Выполняет callback после коммита текущей транзакции или сразу, если её нет"""
+        uow = db.session.info.get(UnitOfWork.SESSION_KEY)
+        if uow is not None:
+            uow.after_commit(callback, *args)
+        else:
+            callback(*args)
+
+    @staticmethod
+    def _commit():
+        """Коммитит сессию, а внутри unit_of_work() только сбрасывает изменения"""
+        if UnitOfWork.SESSION_KEY in db.session.info:
+            db.session.flush()
+        else:
+            db.session.commit()
+
     def _execute(self, method: BaseMethod):
         """Выполняет операцию с базой данных.
 
@@ -31,8 +111,8 @@ class Base(db.Model):
                     db.session.add(self)
                 case BaseMethod.DELETE:
                     db.session.delete(self)
-            db.session.commit()
-            logger.debug(f"Успешный {method} для {self.__class__.__name__}")
+            self._commit()
+            logger.debug("Успешный %s для %s", method, self.__class__.__name__)
             return True if method == BaseMethod.DELETE else self
         except Exception as e:
             db.session.rollback()
@@ -75,6 +155,8 @@ class Base(db.Model):
 __all__ = [
     "Base",
     "db",
+    "TINYINT",
+    "SMALLINT",
     "INTEGER",
     "BIGINT",
     "VARCHAR",
@@ -1,22 +1,37 @@
 from app.models.base_model import *
+from datetime import datetime
 from enum import Enum
-from sqlalchemy import Enum as SQLAlchemyEnum, event
+from sqlalchemy import Enum as SQLAlchemyEnum
+from app.utils import Logger
+
+logger = Logger("Order")
 
 class StatusType(Enum):
     PENDING = "pending"
+    PAID = "paid"
     CANCELLED = "cancelled"
     DELIVERED = "delivered"
 
 class Order(Base):
     __tablename__ = 'orders'
+    __table_args__ = (
+        db.Index("ix_orders_user_status_order", "user_id", "status", "order_id"),
+        db.Index("ix_orders_status_date", "status", "order_date"),
+    )
     order_id = db.Column(INTEGER(unsigned=True), primary_key=True, nullable=False, autoincrement=True)
     user_id = db.Column(BIGINT(unsigned=True), db.ForeignKey('users.user_id'), nullable=False)
     product_id = db.Column(INTEGER(unsigned=True), db.ForeignKey('products.product_id'), nullable=False)
     invoice_id = db.Column(BIGINT(unsigned=True), nullable=False, unique=True)
     message_id = db.Column(BIGINT(unsigned=True), nullable=False)
     quantity = db.Column(INTEGER(unsigned=True), default=1, server_default="1", nullable=False)
-    order_date = db.Column(DATETIME(), nullable=False, server_default=db.func.now())
+    # UTC из приложения: с ним сравнивает срок оплаты поиск просроченных заказов
+    order_date = db.Column(DATETIME(), nullable=False, default=datetime.utcnow, server_default=db.func.now())
+    # Цена фиксируется при создании заказа и дальше не пересчитывается
+    unit_price = db.Column(INTEGER(unsigned=True), nullable=False, default=0, server_default="0")
+    currency = db.Column(VARCHAR(8), nullable=False, default="RUB", server_default="RUB")
     total_price = db.Column(db.DECIMAL(10, 2), nullable=False, default=0.00, server_default="0.00")
+    asset = db.Column(VARCHAR(16), nullable=True)
+    asset_amount = db.Column(db.DECIMAL(30, 12), nullable=True)
     status = db.Column(SQLAlchemyEnum(StatusType), nullable=False, default=StatusType.PENDING, server_default="PENDING")
 
     product = db.relationship('Product', back_populates='orders')
@@ -25,8 +40,36 @@ class Order(Base):
     def __repr__(self):
         return f'<Product {self.product_id}>'
 
-@event.listens_for(Order, 'before_insert')
-@event.listens_for(Order, 'before_update')
-def calculate_total_price(mapper, connection, target):
-    if target.product and target.quantity:
-        target.total_price = target.quantity * target.product.price
\ No newline at end of file
+    @classmethod
+    def priced(cls, unit_price: int, quantity: int, asset: str, asset_amount: float,
+               currency: str = "RUB", **kwargs) -> "Order":
+        """Создает заказ со снимком цены на момент оформления"""
+        return cls(
+            unit_price   = unit_price,
+            quantity     = quantity,
+            currency     = currency,
+            total_price  = unit_price * quantity,
+            asset        = asset,
+            asset_amount = asset_amount,
+            **kwargs
+        )
+
+    @classmethod
+    def transition(cls, order_id: int, status: StatusType, current: StatusType = StatusType.PENDING) -> bool:
+        """Переводит заказ из статуса current в status одним условным UPDATE.
+
+        Returns:
+            bool: False, если заказ уже не в статусе current.
+
+        Raises:
+            RuntimeError: Если запись не удалась.
+        """
+        try:
+            updated = cls.query.filter_by(order_id=order_id, status=current).update(
+                {cls.status: status}, synchronize_session=False)
+            cls._commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Ошибка смены статуса заказа #{order_id} на {status}: {e}")
+            raise RuntimeError(f"Error changing status of order {order_id}: {e}") from e
+        return bool(updated)
@@ -1,4 +1,10 @@
 from app.models.base_model import *
+from app.utils import Logger, product_snapshot
+from sqlalchemy import case, event, func, update
+from typing import Dict
+from sqlalchemy.orm import object_session
+
+logger = Logger("Product")
 
 class Product(Base):
     __tablename__ = 'products'
@@ -11,4 +17,140 @@ class Product(Base):
     orders = db.relationship('Order', back_populates='product', lazy='dynamic')
 
     def __repr__(self):
-        return f'<Product {self.product_id}>'
\ No newline at end of file
+        return f'<Product {self.product_id}>'
+
+    @classmethod
+    def _change_quantity(cls, product_id: int, delta: int, *conditions) -> bool:
+        """Атомарно меняет остаток одним UPDATE без чтения строки в Python.
+
+        Returns:
+            bool: True, если строка подошла под условия и была изменена.
+
+        Raises:
+            RuntimeError: Если запрос не удался.
+        """
+        stmt = (update(cls)
+                .where(cls.product_id == product_id, *conditions)
+                .values(quantity=cls.quantity + delta)
+                .execution_options(synchronize_session=False))
+        try:
+            result = db.session.execute(stmt)
+            cls._commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Ошибка изменения остатка товара {product_id} на {delta}: {e}")
+            raise RuntimeError(f"Error changing quantity for product {product_id}: {e}") from e
+
+        changed = result.rowcount == 1
+        if changed:
+            cls.after_commit(product_snapshot.invalidate)
+        return changed
+
+    @classmethod
+    def reserve(cls, product_id: int, quantity: int) -> bool:
+        """Резервирует товар, если остатка хватает.
+
+        Returns:
+            bool: False, если остатка недостаточно или товар не найден.
+        """
+        reserved = cls._change_quantity(product_id, -quantity, cls.quantity >= quantity)
+        if reserved:
+            logger.info(f"Зарезервировано {quantity} шт. товара {product_id}")
+        else:
+            logger.warn(f"Недостаточно товара {product_id} для резерва {quantity} шт.")
+        return reserved
+
+    @classmethod
+    def release(cls, product_id: int, quantity: int) -> bool:
+        """Возвращает зарезервированный товар в остаток"""
+        released = cls._change_quantity(product_id, quantity)
+        if released:
+            logger.info(f"Возвращено {quantity} шт. товара {product_id}")
+        return released
+
+    @classmethod
+    def release_many(cls, quantities: Dict[int, int]) -> int:
+        """Возвращает остатки нескольких товаров одним UPDATE ... CASE.
+
+        Args:
+            quantities: product_id -> количество к возврату.
+
+        Returns:
+            int: Количество измененных товаров.
+
+        Raises:
+            RuntimeError: Если запрос не удался.
+        """
+        if not quantities:
+            return 0
+
+        stmt = (update(cls)
+                .where(cls.product_id.in_(quantities))
+                .values(quantity=cls.quantity + case(quantities, value=cls.product_id, else_=0))
+                .execution_options(synchronize_session=False))
+        try:
+            result = db.session.execute(stmt)
+            cls._commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Ошибка возврата остатков товаров {list(quantities)}: {e}")
+            raise RuntimeError(f"Error releasing products {list(quantities)}: {e}") from e
+
+        if result.rowcount:
+            cls.after_commit(product_snapshot.invalidate)
+            logger.info(f"Возвращены остатки товаров: {quantities}")
+        return result.rowcount
+
+    @classmethod
+    def restock_many(cls, increments: Dict[int, int], max_quantities: Dict[int, int]) -> int:
+        """Пополняет несколько товаров одним UPDATE, не поднимая остаток выше максимума.
+
+        Товары, остаток которых уже не ниже максимума, не меняются.
+
+        Returns:
+            int: Количество пополненных товаров.
+
+        Raises:
+            RuntimeError: Если запрос не удался.
+        """
+        if not increments:
+            return 0
+
+        cap = case(max_quantities, value=cls.product_id)
+        stmt = (update(cls)
+                .where(cls.product_id.in_(increments), cls.quantity < cap)
+                .values(quantity=func.least(cls.quantity + case(increments, value=cls.product_id, else_=0), cap))
+                .execution_options(synchronize_session=False))
+        try:
+            result = db.session.execute(stmt)
+            cls._commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Ошибка пополнения товаров {list(increments)}: {e}")
+            raise RuntimeError(f"Error restocking products {list(increments)}: {e}") from e
+
+        if result.rowcount:
+            cls.after_commit(product_snapshot.invalidate)
+        return result.rowcount
+
+    @classmethod
+    def restock(cls, product_id: int, quantity: int, max_quantity: int = None) -> bool:
+        """Пополняет остаток. Если задан max_quantity, пополняет только пока остаток ниже него"""
+        conditions = (cls.quantity < max_quantity,) if max_quantity is not None else ()
+        return cls._change_quantity(product_id, quantity, *conditions)
+
+@event.listens_for(Product, 'after_insert')
+@event.listens_for(Product, 'after_update')
+@event.listens_for(Product, 'after_delete')
+def mark_products_changed(mapper, connection, target):
+    object_session(target).info["products_changed"] = True
+
+@event.listens_for(db.session, 'after_commit')
+def invalidate_product_labels(session):
+    # Перерисовываем подписи только после коммита, чтобы не прочитать незакоммиченные остатки
+    if session.info.pop("products_changed", False):
+        product_snapshot.invalidate()
+
+@event.listens_for(db.session, 'after_rollback')
+def reset_products_changed(session):
+    session.info.pop("products_changed", None)
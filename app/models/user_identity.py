@@ -0,0 +1,107 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Tuple
+from sqlalchemy import select, update
+from sqlalchemy.dialects.mysql import insert
+from sqlalchemy.exc import IntegrityError
+from app.models.base_model import db
+from app.models.user_model import User
+from app.utils import Logger
+
+logger = Logger("UserIdentity")
+
+class UserIdentityCache:
+    """LRU известных пользователей с TTL.
+
+    Пока запись свежа, обновление от пользователя не обращается к БД.
+    Новые пользователи добавляются через INSERT IGNORE, поэтому одновременные
+    первые обращения не падают на уникальности user_id или username.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl_seconds: float = 600):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.entries: "OrderedDict[int, Tuple[str, float]]" = OrderedDict()  # user_id -> (username, expires_at)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def ensure(self, user_id: int, username: str):
+        """Гарантирует, что пользователь есть в БД и его username актуален.
+
+        Raises:
+            RuntimeError: Если запись в БД не удалась.
+        """
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry and entry[1] > now:
+                self.entries.move_to_end(user_id, last=True)
+                if entry[0] == username:
+                    self.hits += 1
+                    return
+            self.misses += 1
+
+        try:
+            stored = self._sync(user_id, username)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Ошибка создания пользователя: user_id[{user_id}] username[\"{username}\"]: {e}")
+            raise RuntimeError(f"Error ensuring user {user_id}: {e}") from e
+
+        if stored != username:
+            logger.debug("Пользователь %s сохранен под именем \"%s\"", user_id, stored)
+
+        # Кэшируем пришедшее имя, чтобы не повторять неудачное переименование до истечения TTL
+        with self.lock:
+            self.entries[user_id] = (username, now + self.ttl_seconds)
+            self.entries.move_to_end(user_id, last=True)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def _sync(self, user_id: int, username: str) -> str:
+        """Создает или переименовывает пользователя, возвращает сохраненный username"""
+        stored = db.session.execute(select(User.username).where(User.user_id == user_id)).scalar()
+
+        if stored is None:
+            logger.info(f"Создание нового пользователя: user_id[{user_id}] username[\"{username}\"]")
+            result = db.session.execute(insert(User).prefix_with("IGNORE").values(user_id=user_id, username=username))
+            if result.rowcount:
+                return username
+
+            stored = db.session.execute(select(User.username).where(User.user_id == user_id)).scalar()
+            if stored is None:
+                # username занят другим пользователем
+                fallback = f"unknown_{user_id}"
+                logger.warn(f"Имя \"{username}\" занято, пользователь {user_id} сохранен как \"{fallback}\"")
+                db.session.execute(insert(User).prefix_with("IGNORE").values(user_id=user_id, username=fallback))
+                return fallback
+
+        if stored != username:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(update(User).where(User.user_id == user_id).values(username=username))
+                logger.info(f"Пользователь {user_id} сменил имя: \"{stored}\" -> \"{username}\"")
+                return username
+            except IntegrityError:
+                logger.warn(f"Имя \"{username}\" занято, у пользователя {user_id} остается \"{stored}\"")
+
+        return stored
+
+    def forget(self, user_id: int):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def stats(self) -> Dict[str, float]:
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+user_identity = UserIdentityCache()
@@ -1,11 +1,14 @@
-from sqlalchemy.dialects.mysql import LONGTEXT
 from app.models.base_model import *
 
 class User(Base):
     __tablename__ = 'users'
     user_id = db.Column(BIGINT(unsigned=True), primary_key=True, nullable=False, autoincrement=False)
     username = db.Column(VARCHAR(32), nullable=False, unique=True)
-    choice = db.Column(db.TEXT(), nullable=False, default="")
+
+    # Состояние выбора в сценарии покупки: товар -> количество -> валюта
+    choice_product_id = db.Column(SMALLINT(unsigned=True), nullable=True)
+    choice_qty = db.Column(TINYINT(unsigned=True), nullable=True)
+    choice_asset_id = db.Column(TINYINT(unsigned=True), nullable=True)
 
     orders = db.relationship('Order', back_populates='user', lazy='dynamic')
 
@@ -0,0 +1,69 @@
+from dataclasses import dataclass, replace
+from typing import Dict, Optional
+from sqlalchemy import update
+from app.models.base_model import Base, db
+from app.models.user_model import User
+from app.utils import Logger
+
+logger = Logger("ChoiceStore")
+
+@dataclass(frozen=True)
+class ChoiceState:
+    """Выбор пользователя в сценарии покупки"""
+    product_id: Optional[int] = None
+    qty: Optional[int] = None
+    asset_id: Optional[int] = None
+
+    STAGES = ("product_id", "qty", "asset_id")
+
+    @classmethod
+    def stage_row(cls, stage: int, value: int) -> Dict[str, Optional[int]]:
+        """Колонки users для выбора этапа (1 — товар, 2 — количество, 3 — валюта): сам этап и сброс следующих"""
+        row = {f"choice_{name}": None for name in cls.STAGES[stage:]}
+        row[f"choice_{cls.STAGES[stage - 1]}"] = value
+        return row
+
+    def apply_row(self, row: Dict[str, Optional[int]]) -> "ChoiceState":
+        """Состояние после записи строки из stage_row()"""
+        return replace(self, **{name: row[f"choice_{name}"] for name in self.STAGES if f"choice_{name}" in row})
+
+
+class ChoiceStore:
+    """Выбор пользователей в строке users без кэша в процессе.
+
+    Обновления одного пользователя могут попасть в разные воркеры, поэтому
+    каждый выбор сразу пишется одним UPDATE по первичному ключу, а чтение —
+    один SELECT по нему же, и любой воркер видит последнее нажатие. В пределах
+    одного обновления контекст читает строку не больше одного раза.
+    """
+
+    def get(self, user_id: int) -> ChoiceState:
+        """Возвращает выбор пользователя из БД"""
+        row = db.session.query(User.choice_product_id, User.choice_qty, User.choice_asset_id) \
+            .filter(User.user_id == user_id).first()
+        return ChoiceState(*row) if row else ChoiceState()
+
+    def set_stage(self, user_id: int, stage: int, value: int) -> Dict[str, Optional[int]]:
+        """Выставляет этап выбора и сбрасывает следующие одним UPDATE, без чтения строки.
+
+        Внутри Base.unit_of_work() запись попадает в общую транзакцию.
+
+        Returns:
+            dict: Записанные колонки, см. ChoiceState.stage_row().
+
+        Raises:
+            RuntimeError: Если запись не удалась.
+        """
+        values = ChoiceState.stage_row(stage, value)
+        try:
+            db.session.execute(update(User).where(User.user_id == user_id).values(**values))
+            Base._commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Ошибка записи выбора пользователя {user_id}: {e}")
+            raise RuntimeError(f"Error saving choice for user {user_id}: {e}") from e
+
+        logger.debug("Записан выбор пользователя %s: %s", user_id, values)
+        return values
+
+choice_store = ChoiceStore()
@@ -1,4 +1,5 @@
 from .webhook import webhook_bp
+from .crypto_pay import crypto_pay_bp
 
-__all__ = ["webhook_bp"]
+__all__ = ["webhook_bp", "crypto_pay_bp"]
 
@@ -0,0 +1,40 @@
+import hashlib
+import hmac
+from flask import Blueprint, request, current_app
+from app.config import Config
+from app.utils import Logger
+
+logger = Logger("CryptoPayWebhook")
+
+crypto_pay_bp = Blueprint('crypto_pay', __name__)
+
+def verify_signature(body: bytes, signature: str, token: str) -> bool:
+    """Проверяет подпись Crypto Pay: HMAC-SHA256 тела с ключом SHA256(token)"""
+    if not signature or not token:
+        return False
+    secret = hashlib.sha256(token.encode()).digest()
+    expected = hmac.new(secret, body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+@crypto_pay_bp.route('/crypto-pay/webhook', methods=['POST'])
+def crypto_pay_webhook():
+    body = request.get_data()
+    if not verify_signature(body, request.headers.get('crypto-pay-api-signature'), Config.CRYPTO_BOT_TOKEN):
+        logger.warn(f"Неверная подпись веб-хука Crypto Pay от {request.remote_addr}")
+        return '', 401
+
+    data = request.get_json(silent=True) or {}
+    if data.get('update_type') != 'invoice_paid' or not isinstance(data.get('payload'), dict):
+        logger.warn(f"Неизвестное обновление Crypto Pay: update_id[{data.get('update_id')}]")
+        return '', 200
+
+    invoice_id = data['payload'].get('invoice_id')
+    try:
+        current_app.crypto_bot.invoice_manager.apply_updates([data['payload']])
+    except Exception as e:
+        # Ошибка подтверждения заказа: Crypto Pay повторит доставку
+        logger.error(f"Не удалось подтвердить оплату инвойса {invoice_id}: {e}")
+        return '', 500
+
+    logger.info(f"Получено уведомление об оплате инвойса {invoice_id}")
+    return '', 200
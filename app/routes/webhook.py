@@ -6,5 +6,9 @@ webhook_bp = Blueprint('webhook', __name__)
 @webhook_bp.route('/webhook', methods=['POST'])
 def webhook():
     update = Update.de_json(request.get_json(), current_app.bot)
-    current_app.dispatcher.process_update(update)
+    if current_app.update_queue is None:
+        current_app.dispatcher.process_update(update)
+    elif not current_app.update_queue.put(update):
+        # Очередь переполнена: Telegram повторит доставку позже
+        return '', 503
     return '', 200
\ No newline at end of file
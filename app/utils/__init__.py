@@ -1,7 +1,13 @@
-from .logger import Logger
+from .logger import Logger, Lazy
 from .templates import templates
+from .http_transport import transport, HttpTransport
+from .product_snapshot import product_snapshot, ProductState
 from .keyboard import keyboard
 from .crypto_bot_api import CryptoBotAPI
-from .task_scheduler import TaskScheduler
+from .quote_book import QuoteBook
+from .restock_engine import RestockEngine, RestockPolicy
+from .task_scheduler import TaskScheduler, IntervalTrigger, CronTrigger
+from .leader_lock import LeaderLock
+from .update_queue import UpdateQueue
 
-__all__ = ["Logger", "templates", "keyboard", "CryptoBotAPI", "TaskScheduler"]
\ No newline at end of file
+__all__ = ["Logger", "Lazy", "templates", "transport", "HttpTransport", "product_snapshot", "ProductState", "keyboard", "CryptoBotAPI", "QuoteBook", "RestockEngine", "RestockPolicy", "TaskScheduler", "IntervalTrigger", "CronTrigger", "LeaderLock", "UpdateQueue"]
\ No newline at end of file
@@ -1,14 +1,16 @@
 import requests
 import time
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any, List, Union
-from dataclasses import dataclass
+from typing import Optional, Dict, Any, List, Tuple, Union, Callable
+from dataclasses import dataclass, fields
 import threading
 from ..config import Config
 from . import Logger
-import logging
+from .http_transport import transport
+from .task_scheduler import TaskScheduler
+from .rate_matrix import RateMatrix
 
-logger = Logger("CryptoBotAPI", logging.DEBUG)
+logger = Logger("CryptoBotAPI")
 
 @dataclass
 class ExchangeRate:
@@ -38,35 +40,96 @@ class CurrencyPair:
 
 
 class CurrencyCache:
-    """Кэш для курсов валют с TTL"""
+    """Кэш для курсов валют с TTL.
 
-    def __init__(self, ttl_minutes: int = 1):
+    Курсы моложе TTL считаются свежими, после refresh_ahead * TTL их пора
+    обновлять в фоне, а старше max_stale_minutes ими пользоваться нельзя.
+    """
+
+    def __init__(self, ttl_minutes: int = 1, max_stale_minutes: Optional[int] = None,
+                 refresh_ahead: float = 0.8):
         self.cache: Dict[str, ExchangeRate] = {}
         self.pairs: Dict[str, CurrencyPair] = {}
         self.ttl_minutes = ttl_minutes
+        self.max_stale_minutes = max_stale_minutes if max_stale_minutes is not None else ttl_minutes * 6
+        self.refresh_ahead = refresh_ahead
         self.last_full_update = None
+        self.lock = threading.RLock()  # Кэш общий для всех потоков обработки обновлений
+        self.listeners: List[Callable[["CurrencyCache"], None]] = []
+
+        # Метрики
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    def add_refresh_listener(self, listener: Callable[["CurrencyCache"], None]):
+        """Подписывает listener(cache) на каждое успешное обновление курсов"""
+        self.listeners.append(listener)
+
+    def age(self) -> Optional[timedelta]:
+        """Возраст последнего полного обновления"""
+        return datetime.now() - self.last_full_update if self.last_full_update else None
+
+    def is_fresh(self) -> bool:
+        age = self.age()
+        return age is not None and age <= timedelta(minutes=self.ttl_minutes)
+
+    def needs_refresh(self) -> bool:
+        """Пора ли обновлять курсы заранее, до истечения TTL"""
+        age = self.age()
+        return age is None or age >= timedelta(minutes=self.ttl_minutes * self.refresh_ahead)
+
+    def is_usable(self) -> bool:
+        """Можно ли пользоваться курсами: есть данные и они не старше max_stale_minutes"""
+        age = self.age()
+        return age is not None and age <= timedelta(minutes=self.max_stale_minutes)
+
+    def record_lookup(self):
+        """Учитывает обращение к кэшу в метриках"""
+        with self.lock:
+            if self.is_fresh():
+                self.hits += 1
+            elif self.is_usable():
+                self.stale_hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            age = self.age()
+            return {
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+                "refresh_errors": self.refresh_errors,
+                "age_seconds": age.total_seconds() if age else None,
+                "rates": len(self.cache),
+            }
 
     def is_expired(self, rate: ExchangeRate) -> bool:
         """Проверяет, истек ли TTL для курса"""
-        if not self.last_full_update:
-            return True
         return datetime.now() - rate.timestamp > timedelta(minutes=self.ttl_minutes)
 
     def get_pair(self, source: str, target: str) -> Optional[CurrencyPair]:
         """Получает пару валют из кэша"""
         key = f"{source}_{target}"
-        return self.pairs.get(key)
+        with self.lock:
+            return self.pairs.get(key)
 
     def update_pair(self, source: str, target: str, rate: ExchangeRate) -> CurrencyPair:
         """Обновляет пару валют в кэше"""
         key = f"{source}_{target}"
-        if key not in self.pairs:
-            self.pairs[key] = CurrencyPair(source=source, target=target)
+        with self.lock:
+            if key not in self.pairs:
+                self.pairs[key] = CurrencyPair(source=source, target=target)
 
-        pair = self.pairs[key]
-        pair.forward_rate = rate.rate if rate.is_valid else None
-        pair.last_updated = rate.timestamp
-        pair.is_valid = rate.is_valid
+            pair = self.pairs[key]
+            pair.forward_rate = rate.rate if rate.is_valid else None
+            pair.last_updated = rate.timestamp
+            pair.is_valid = rate.is_valid
 
         return pair
 
@@ -79,6 +142,17 @@ class CurrencyCache:
 
     def update_from_api(self, rates: List[Dict[str, Any]]) -> None:
         """Обновляет кэш из ответа API"""
+        with self.lock:
+            self._update_from_api(rates)
+            self.refreshes += 1
+
+        for listener in self.listeners:
+            try:
+                listener(self)
+            except Exception as e:
+                logger.error(f"Ошибка обработчика обновления курсов: {e}")
+
+    def _update_from_api(self, rates: List[Dict[str, Any]]) -> None:
         self.last_full_update = datetime.now()
 
         for rate_data in rates:
@@ -90,7 +164,7 @@ class CurrencyCache:
                     source=rate_data['source'],
                     target=rate_data['target'],
                     rate=rate_data['rate'],
-                    timestamp=datetime.now()
+                    timestamp=self.last_full_update
                 )
 
                 # Обновляем кэш только валидными курсами
@@ -103,11 +177,11 @@ class CurrencyCache:
                 continue
 
     def get_all_valid_rates(self) -> List[ExchangeRate]:
-        """Возвращает все валидные курсы из кэша"""
-        return [
-            rate for rate in self.cache.values()
-            if rate.is_valid and not self.is_expired(rate)
-        ]
+        """Возвращает все валидные курсы, если кэш еще пригоден к использованию"""
+        with self.lock:
+            if not self.is_usable():
+                return []
+            return [rate for rate in self.cache.values() if rate.is_valid]
 
 
 @dataclass
@@ -138,6 +212,12 @@ class Invoice:
 
     # Добавьте другие поля по необходимости
 
+    @classmethod
+    def from_api(cls, data: Dict[str, Any]) -> "Invoice":
+        """Создает инвойс из ответа API, отбрасывая неизвестные поля"""
+        names = {field.name for field in fields(cls)}
+        return cls(**{key: value for key, value in data.items() if key in names})
+
     def __post_init__(self):
         if self.amount:
             self.amount = float(self.amount)
@@ -147,17 +227,73 @@ class Invoice:
             self.fee_in_usd = float(self.fee_in_usd)
 
 class InvoiceManager:
-    """Менеджер для отслеживания и отмены инвойсов по времени"""
+    """Менеджер для отслеживания и отмены инвойсов по времени.
+
+    Статусы хранятся локально и обновляются пакетным опросом API; проверки
+    из обработчиков отвечают из локального состояния. Подписчики
+    add_listener() получают каждый пришедший статус, а не только изменение:
+    по previous_status можно отличить новый статус от повторного. Вызов идет
+    вне блокировки, ошибка подписчика пробрасывается из apply_updates().
+    """
 
     def __init__(self, api):
         self.api = api
         self.invoices: Dict[int, Invoice] = {}  # invoice_id -> Invoice
-        self.expiry_timers: Dict[int, threading.Timer] = {}  # invoice_id -> Timer
+        self.scheduler: TaskScheduler = api.scheduler  # Таймеры отмены — однократные задачи общего планировщика
+        self.listeners: List[Callable[[Invoice, Optional[str]], None]] = []
         self.lock = threading.Lock()
 
+    def add_listener(self, listener: Callable[[Invoice, Optional[str]], None]):
+        """Подписывает listener(invoice, previous_status) на статусы инвойсов"""
+        self.listeners.append(listener)
+
+    def _notify(self, updates: List[Tuple[Invoice, Optional[str]]]):
+        """Вызывает всех подписчиков для всех инвойсов, затем пробрасывает первую ошибку.
+
+        Raises:
+            RuntimeError: Если хотя бы один подписчик завершился ошибкой.
+        """
+        errors = []
+        for invoice, previous_status in updates:
+            for listener in self.listeners:
+                try:
+                    listener(invoice, previous_status)
+                except Exception as e:
+                    logger.error(f"Ошибка обработчика статуса инвойса {invoice.invoice_id}: {e}")
+                    errors.append(e)
+
+        if errors:
+            raise RuntimeError(f"{len(errors)} invoice listener call(s) failed: {errors[0]}") from errors[0]
+
+    def apply_updates(self, items: List[Dict[str, Any]], notify: bool = True) -> List[Invoice]:
+        """Применяет данные инвойсов из API и возвращает те, чей статус изменился.
+
+        Args:
+            notify: Сообщить подписчикам о каждом примененном инвойсе.
+
+        Raises:
+            RuntimeError: Если подписчик не смог обработать статус; локальное состояние уже обновлено.
+        """
+        updates = []
+        with self.lock:
+            for data in items:
+                try:
+                    invoice = Invoice.from_api(data)
+                except (TypeError, ValueError) as e:
+                    logger.warn(f"Ошибка парсинга инвойса {data}: {e}")
+                    continue
+
+                previous = self.invoices.get(invoice.invoice_id)
+                self.invoices[invoice.invoice_id] = invoice
+                updates.append((invoice, previous.status if previous else None))
+
+        if notify:
+            self._notify(updates)
+        return [invoice for invoice, previous_status in updates if previous_status != invoice.status]
+
     def add_invoice(self, invoice_data: Dict[str, Any], auto_cancel_seconds: Optional[int] = None) -> Invoice:
         """Добавляет инвойс в менеджер и устанавливает таймер отмены если нужно"""
-        invoice = Invoice(**invoice_data)
+        invoice = Invoice.from_api(invoice_data)
 
         with self.lock:
             self.invoices[invoice.invoice_id] = invoice
@@ -169,16 +305,13 @@ class InvoiceManager:
 
     def _schedule_cancellation(self, invoice_id: int, seconds: int):
         """Планирует отмену инвойса через указанное время"""
-        if invoice_id in self.expiry_timers:
-            self.expiry_timers[invoice_id].cancel()
-
-        timer = threading.Timer(seconds, self._cancel_invoice, args=(invoice_id,))
-        timer.daemon = True
-        timer.start()
-
-        self.expiry_timers[invoice_id] = timer
+        self.scheduler.schedule_once(self._cancel_invoice, seconds, self._expiry_task_id(invoice_id), invoice_id)
         logger.info(f"Запланирована отмена инвойса {invoice_id} через {seconds} секунд")
 
+    @staticmethod
+    def _expiry_task_id(invoice_id: int) -> str:
+        return f"invoice-expiry:{invoice_id}"
+
     def _cancel_invoice(self, invoice_id: int):
         """Отменяет инвойс по таймауту"""
         with self.lock:
@@ -196,100 +329,138 @@ class InvoiceManager:
             with self.lock:
                 if invoice_id in self.invoices:
                     self.invoices[invoice_id].status = "expired"  # Или "cancelled"
-                if invoice_id in self.expiry_timers:
-                    del self.expiry_timers[invoice_id]
         else:
             logger.error(f"Ошибка отмены инвойса {invoice_id} по таймауту")
 
-    def check_invoice_status(self, invoice_id: int, update_from_api: bool = True) -> Optional[Invoice]:
-        """Проверяет статус инвойса"""
-        with self.lock:
-            if invoice_id in self.invoices:
-                invoice = self.invoices[invoice_id]
+    def check_invoice_status(self, invoice_id: int, update_from_api: bool = False) -> Optional[Invoice]:
+        """Проверяет статус инвойса.
 
-                if not update_from_api:
-                    return invoice
+        Известные инвойсы отдаются из локального состояния, в API идем только
+        за неизвестными или по явному update_from_api. Сетевой запрос
+        выполняется без удержания блокировки.
+        """
+        with self.lock:
+            invoice = self.invoices.get(invoice_id)
+        if invoice and not update_from_api:
+            return invoice
 
-            # Обновляем из API
-            updated_data = self.api.get_invoices(invoice_ids=str(invoice_id))
-            if updated_data and updated_data[0]:
-                updated_invoice = Invoice(**updated_data[0])
-                self.invoices[invoice_id] = updated_invoice
-                return updated_invoice
+        # Обновляем из API
+        updated_data = self.api.get_invoices(invoice_ids=str(invoice_id), count=1)
+        if updated_data:
+            self.apply_updates(updated_data)
+            with self.lock:
+                return self.invoices.get(invoice_id)
 
-        return None
+        return invoice
 
-    def is_paid(self, invoice_id: int) -> bool or None:
+    def is_paid(self, invoice_id: int, update_from_api: bool = False) -> bool or None:
         """Проверяет, оплачен ли инвойс"""
-        invoice = self.check_invoice_status(invoice_id)
+        invoice = self.check_invoice_status(invoice_id, update_from_api)
         return invoice.status == "paid" if invoice else None
 
     def remove_invoice(self, invoice_id: int):
         """Удаляет инвойс из менеджера"""
         with self.lock:
-            if invoice_id in self.expiry_timers:
-                self.expiry_timers[invoice_id].cancel()
-                del self.expiry_timers[invoice_id]
+            self.scheduler.cancel(self._expiry_task_id(invoice_id))
             if invoice_id in self.invoices:
                 del self.invoices[invoice_id]
 
 
 class CryptoBotAPI:
-    def __init__(self, cache_ttl_minutes: int = 1, auto_cancel_default_seconds: int = 3600):
+    """Клиент Crypto Pay API.
+
+    Создается один раз на процесс в create_app и хранится в app.crypto_bot:
+    кэш курсов, менеджер инвойсов и rate limiter общие для всех обновлений.
+    """
+
+    # Бюджеты запросов по методам: (запросов, окно в секундах)
+    METHOD_LIMITS = {
+        "createInvoice": (60, 60),
+        "getInvoices": (30, 60),
+        "getExchangeRates": (10, 60),
+    }
+
+    # Максимальный размер страницы getInvoices
+    INVOICES_PAGE_SIZE = 100
+
+    # Сколько ждать чужого обновления курсов при пустом кэше
+    RATES_REFRESH_WAIT_SECONDS = 15
+
+    def __init__(self, cache_ttl_minutes: int = 1, auto_cancel_default_seconds: int = 3600,
+                 invoice_poll_seconds: int = 300, rates_max_stale_minutes: Optional[int] = None,
+                 scheduler: Optional[TaskScheduler] = None,
+                 invoice_ids_source: Optional[Callable[[], List[int]]] = None):
         self.url = "https://pay.crypt.bot/api/"
         self.headers = {
             "Crypto-Pay-API-Token": Config.CRYPTO_BOT_TOKEN
         }
-        self.currency_cache = CurrencyCache(ttl_minutes=cache_ttl_minutes)
-        self.rate_limiter = RateLimiter(max_requests=100, window_seconds=60)
+        self.currency_cache = CurrencyCache(ttl_minutes=cache_ttl_minutes,
+                                            max_stale_minutes=rates_max_stale_minutes)
+        self._refresh_lock = threading.Lock()
+        self._refresh_flight: Optional[threading.Event] = None
+        self.rate_matrix = RateMatrix.empty()
+        self.currency_cache.add_refresh_listener(self._rebuild_rate_matrix)
+        self.rate_limiter = RateLimiter(max_requests=100, window_seconds=60,
+                                        method_limits=self.METHOD_LIMITS, block=True)
         self.last_error_time = None
         self.error_streak = 0
+        self.scheduler = scheduler or TaskScheduler(name="crypto-bot")
         self.invoice_manager = InvoiceManager(self)
         self.auto_cancel_default = auto_cancel_default_seconds  # По умолчанию 1 час
+        self.invoice_poll_seconds = invoice_poll_seconds
+        self.invoice_ids_source = invoice_ids_source  # Источник id ожидающих инвойсов всех процессов
 
         # Запускаем фоновую проверку инвойсов
         self._start_invoice_checker()
 
     def _start_invoice_checker(self):
         """Запускает планировщик для периодической проверки инвойсов"""
+        # С общим источником id опрос нужен только в ведущем процессе
+        self.scheduler.start_task(self.poll_invoices, self.invoice_poll_seconds, task_id="invoice_poll",
+                                  singleton=self.invoice_ids_source is not None)
 
-        def check_invoices():
+    def poll_invoices(self) -> List[Invoice]:
+        """Пакетно опрашивает активные инвойсы.
+
+        id разбиваются на страницы размера INVOICES_PAGE_SIZE, результаты
+        сливаются в InvoiceManager и передаются подписчикам, возвращаются
+        инвойсы с изменившимся статусом. Если задан invoice_ids_source, id
+        берутся из него, иначе — активные инвойсы этого процесса.
+        """
+        if self.invoice_ids_source is not None:
+            active_ids = self.invoice_ids_source()
+        else:
             with self.invoice_manager.lock:
                 active_ids = [inv.invoice_id for inv in self.invoice_manager.invoices.values()
                               if inv.status == "active"]
 
-            if active_ids:
-                logger.debug(f"Проверка {len(active_ids)} активных инвойсов")
-                updated = self.get_invoices(invoice_ids=','.join(map(str, active_ids)),
-                                            status="active")
-
-                if updated:
-                    for data in updated:
-                        inv = Invoice(**data)
-                        self.invoice_manager.invoices[inv.invoice_id] = inv
-                        if inv.status == "paid":
-                            logger.info(f"Инвойс {inv.invoice_id} оплачен!")
-                        elif inv.status == "expired":
-                            logger.info(f"Инвойс {inv.invoice_id} истек")
-
-        # Проверяем каждые 5 минут
-        threading.Thread(target=self._run_scheduler, args=(check_invoices, 300), daemon=True).start()
-
-    def _run_scheduler(self, task, interval_seconds: int):
-        """Запускает задачу по расписанию"""
-        while True:
-            try:
-                task()
-            except Exception as e:
-                logger.error(f"Ошибка в планировщике: {e}")
-            time.sleep(interval_seconds)
+        if not active_ids:
+            return []
+
+        logger.debug("Проверка %s активных инвойсов", len(active_ids))
+        items = []
+        for start in range(0, len(active_ids), self.INVOICES_PAGE_SIZE):
+            chunk = active_ids[start:start + self.INVOICES_PAGE_SIZE]
+            result = self.get_invoices(invoice_ids=','.join(map(str, chunk)), count=len(chunk))
+            if result is None:
+                logger.warn(f"Не удалось получить статусы {len(chunk)} инвойсов")
+                continue
+            items.extend(result)
+
+        changed = self.invoice_manager.apply_updates(items)
+        for inv in changed:
+            if inv.status == "paid":
+                logger.info(f"Инвойс {inv.invoice_id} оплачен!")
+            elif inv.status == "expired":
+                logger.info(f"Инвойс {inv.invoice_id} истек")
+        return changed
 
     def _execute(self, method: str, params: Optional[Dict[str, Any]] = None,
                  use_get: bool = False) -> Optional[Union[Dict[str, Any], List[Dict[str, Any]], bool]]:
         """Выполняет HTTP запрос с улучшенной обработкой ошибок"""
 
         # Проверка rate limiting
-        if not self.rate_limiter.allow_request():
+        if not self.rate_limiter.allow_request(method):
             logger.warn(f"Превышен лимит запросов для {method}")
             return None
 
@@ -300,18 +471,16 @@ class CryptoBotAPI:
         try:
             # Подготавливаем запрос
             if use_get:
-                response = requests.get(
+                response = transport.get(
                     f"{self.url}{method}",
                     headers=self.headers,
-                    params=params,
-                    timeout=10
+                    params=params
                 )
             else:
-                response = requests.post(
+                response = transport.post(
                     f"{self.url}{method}",
                     headers=self.headers,
-                    data=params,
-                    timeout=10
+                    data=params
                 )
 
             response.raise_for_status()
@@ -319,7 +488,7 @@ class CryptoBotAPI:
 
             # Проверяем ответ API
             if data.get("ok"):
-                logger.debug(f"Успешный запрос: {method}")
+                logger.debug("Успешный запрос: %s", method)
                 self.error_streak = 0  # Сбрасываем счетчик ошибок
                 result = data.get("result")
                 if isinstance(result, bool):  # Для deleteInvoice
@@ -358,56 +527,86 @@ class CryptoBotAPI:
 
     # === КУРСЫ ВАЛЮТ ===
 
+    def _refresh_rates(self) -> bool:
+        """Запрашивает курсы у API. Одновременные вызовы сливаются в один запрос.
+
+        Returns:
+            bool: True, если после обновления курсами можно пользоваться.
+        """
+        with self._refresh_lock:
+            flight = self._refresh_flight
+            leader = flight is None
+            if leader:
+                flight = self._refresh_flight = threading.Event()
+
+        if not leader:
+            flight.wait(self.RATES_REFRESH_WAIT_SECONDS)
+            return self.currency_cache.is_usable()
+
+        try:
+            logger.info("Обновление курсов валют")
+            result = self._execute("getExchangeRates", use_get=True)
+            if result:
+                self.currency_cache.update_from_api(result)
+                logger.info(f"Получено {len(self.currency_cache.cache)} валидных курсов")
+            else:
+                with self.currency_cache.lock:
+                    self.currency_cache.refresh_errors += 1
+        except Exception as e:
+            logger.error(f"Ошибка обработки курсов: {e}")
+            with self.currency_cache.lock:
+                self.currency_cache.refresh_errors += 1
+        finally:
+            with self._refresh_lock:
+                self._refresh_flight = None
+            flight.set()
+
+        return self.currency_cache.is_usable()
+
+    def _refresh_rates_async(self):
+        """Обновляет курсы в фоне, если обновление еще не идет"""
+        with self._refresh_lock:
+            if self._refresh_flight is not None:
+                return
+        self.scheduler.schedule_once(self._refresh_rates, 0, "rates_refresh")
+
     def get_exchange_rates(self, force_refresh: bool = False) -> Optional[List[ExchangeRate]]:
         """
         Получает курсы валют с кэшированием
 
+        Пока кэш пригоден, курсы отдаются сразу, а ближе к истечению TTL
+        обновляются в фоне. Синхронный запрос делается только при пустом
+        или слишком устаревшем кэше.
+
         Args:
             force_refresh: Принудительно обновить кэш
 
         Returns:
             Список ExchangeRate или None при ошибке
         """
-        # Проверяем кэш
-        if not force_refresh:
-            cached_rates = self.currency_cache.get_all_valid_rates()
-            if cached_rates:
-                logger.debug(f"Используем кэш: {len(cached_rates)} курсов")
-                return cached_rates
-
-        # Делаем запрос к API
-        logger.info("Обновление курсов валют")
-        result = self._execute("getExchangeRates", use_get=True)
-
-        if result:
-            try:
-                # Обновляем кэш
-                self.currency_cache.update_from_api(result)
-
-                # Возвращаем актуальные курсы
-                fresh_rates = self.currency_cache.get_all_valid_rates()
-                logger.info(f"Получено {len(fresh_rates)} валидных курсов")
-
-                # Логируем ключевые курсы
-                usd_rates = {r.target: r.rate for r in fresh_rates
-                             if r.source == "USDT" and r.is_valid}
-                if usd_rates:
-                    logger.debug(f"USD курсы: {usd_rates}")
+        if not self.ensure_rates(force_refresh):
+            return None
+        return self.currency_cache.get_all_valid_rates() or None
 
-                return fresh_rates
+    def ensure_rates(self, force_refresh: bool = False) -> bool:
+        """Проверяет, что курсы пригодны, и при необходимости запускает их обновление"""
+        self.currency_cache.record_lookup()
 
-            except Exception as e:
-                logger.error(f"Ошибка обработки курсов: {e}")
-                return None
+        if force_refresh or not self.currency_cache.is_usable():
+            if not self._refresh_rates():
+                logger.error("Нет пригодных курсов валют")
+                return False
+        elif self.currency_cache.needs_refresh():
+            self._refresh_rates_async()
 
-        # Fallback к кэшу при ошибке
-        stale_rates = [r for r in self.currency_cache.cache.values()
-                       if not self.currency_cache.is_expired(r)]
-        if stale_rates:
-            logger.warn(f"Используем устаревший кэш: {len(stale_rates)} курсов")
-            return stale_rates
+        return True
 
-        return None
+    def _rebuild_rate_matrix(self, cache: CurrencyCache):
+        """Пересчитывает матрицу курсов после обновления кэша"""
+        with cache.lock:
+            pairs = [(rate.source, rate.target, rate.rate) for rate in cache.cache.values() if rate.is_valid]
+        self.rate_matrix = RateMatrix.build(pairs)
+        logger.debug("Матрица курсов пересчитана: %s валют", len(self.rate_matrix.currencies))
 
     def get_exchange_rate(self, source: str, target: str,
                           force_refresh: bool = False) -> Optional[ExchangeRate]:
@@ -422,10 +621,12 @@ class CryptoBotAPI:
         Returns:
             ExchangeRate или None
         """
-        # Сначала проверяем кэш
-        cached_rate = self.currency_cache.get_rate(source, target)
-        if cached_rate and not force_refresh:
-            logger.debug(f"Курс {source}->{target} из кэша: {cached_rate}")
+        if not self.ensure_rates(force_refresh):
+            return None
+
+        cached_rate = self.rate_matrix.rate(source, target)
+        if cached_rate:
+            logger.debug("Курс %s->%s из кэша: %s", source, target, cached_rate)
             return ExchangeRate(
                 is_valid=True,
                 is_crypto=True,  # USDT -> крипта
@@ -433,20 +634,9 @@ class CryptoBotAPI:
                 source=source,
                 target=target,
                 rate=cached_rate,
-                timestamp=datetime.now()
+                timestamp=self.currency_cache.last_full_update
             )
 
-        # Получаем все курсы
-        rates = self.get_exchange_rates(force_refresh=force_refresh)
-        if not rates:
-            return None
-
-        # Ищем нужную пару
-        for rate in rates:
-            if rate.source == source and rate.target == target:
-                logger.info(f"Курс {source}->{target}: {rate.rate}")
-                return rate
-
         logger.warn(f"Курс {source}->{target} не найден")
         return None
 
@@ -467,24 +657,44 @@ class CryptoBotAPI:
         if from_currency == to_currency:
             return amount
 
-        # Для USD используем USDT как прокси
-        if from_currency == "USD":
-            from_currency = "USDT"
+        if not self.ensure_rates(force_refresh):
+            return None
 
-        rate = self.get_exchange_rate(from_currency, to_currency, force_refresh)
+        rate = self.rate_matrix.rate(from_currency, to_currency)
+        # Для USD используем USDT как прокси
+        if rate is None and from_currency == "USD":
+            rate = self.rate_matrix.rate("USDT", to_currency)
         if not rate:
             logger.error(f"Не удалось получить курс {from_currency}->{to_currency}")
             return None
 
         try:
-            converted = amount * rate.rate
+            converted = amount * rate
             logger.info(f"Конвертация: {amount} {from_currency} = {converted:.2f} {to_currency} "
-                        f"(курс: {rate.rate})")
+                        f"(курс: {rate})")
             return converted
         except (ValueError, TypeError) as e:
             logger.error(f"Ошибка конвертации: {e}")
             return None
 
+    def convert_many(self, amounts: Dict[Any, float], from_currency: str,
+                     to_currencies: List[str], force_refresh: bool = False) -> Optional[Dict[Any, Dict[str, Optional[float]]]]:
+        """
+        Конвертирует набор сумм во все указанные валюты за один проход по матрице
+
+        Args:
+            amounts: Ключ (например, id товара) -> сумма в from_currency
+            from_currency: Исходная валюта
+            to_currencies: Целевые валюты
+            force_refresh: Принудительно обновить курс
+
+        Returns:
+            Ключ -> {валюта: сумма или None}, либо None без пригодных курсов
+        """
+        if not self.ensure_rates(force_refresh):
+            return None
+        return self.rate_matrix.convert_many(amounts, from_currency, to_currencies)
+
     def get_usd_to_rub_rate(self, force_refresh: bool = False) -> Optional[float]:
         """Удобный метод для получения курса USD -> RUB"""
         rate = self.get_exchange_rate("USDT", "RUB", force_refresh)
@@ -613,21 +823,57 @@ class CryptoBotAPI:
         if status:
             params["status"] = status
 
-        return self._execute("getInvoices", params, use_get=True)["items"]
+        result = self._execute("getInvoices", params, use_get=True)
+        return result["items"] if result else None
 
     def delete_invoice(self, invoice_id: int) -> bool:
-        """Удаляет инвойс"""
-        if self.invoice_manager.invoices.get(invoice_id):
-            params = {"invoice_id": str(invoice_id)}
-            result = self._execute("deleteInvoice", params)
-            if result:
-                self.invoice_manager.remove_invoice(invoice_id)
-            return bool(result)
-        return True
+        """Удаляет инвойс, в том числе неизвестный менеджеру (например, созданный другим воркером)"""
+        result = self._execute("deleteInvoice", {"invoice_id": str(invoice_id)})
+        if result:
+            self.invoice_manager.remove_invoice(invoice_id)
+        return bool(result)
+
+    def delete_invoices(self, invoice_ids: List[int]) -> int:
+        """Удаляет инвойсы по списку, в том числе неизвестные менеджеру (например, после перезапуска).
+
+        У CryptoBot нет пакетного удаления, поэтому запросы идут по одному через общий лимитер.
+
+        Returns:
+            int: Количество удаленных инвойсов.
+        """
+        deleted = 0
+        for invoice_id in invoice_ids:
+            if self._execute("deleteInvoice", {"invoice_id": str(invoice_id)}):
+                deleted += 1
+            self.invoice_manager.remove_invoice(invoice_id)
+        return deleted
+
+    def fetch_invoices(self, invoice_ids: List[int]) -> Optional[List[Invoice]]:
+        """Запрашивает актуальные статусы инвойсов пачками и применяет их к менеджеру.
 
-    def check_invoice_paid(self, invoice_id: int) -> bool or None:
-        """Проверяет оплату инвойса"""
-        return self.invoice_manager.is_paid(invoice_id)
+        Подписчики не уведомляются: решение по статусам принимает вызывающий.
+
+        Returns:
+            list or None: Инвойсы, которые вернул API, или None, если хотя бы один запрос не удался.
+        """
+        invoices = []
+        for start in range(0, len(invoice_ids), self.INVOICES_PAGE_SIZE):
+            chunk = invoice_ids[start:start + self.INVOICES_PAGE_SIZE]
+            items = self.get_invoices(invoice_ids=",".join(map(str, chunk)), count=len(chunk))
+            if items is None:
+                return None
+            self.invoice_manager.apply_updates(items, notify=False)
+            invoices.extend(Invoice.from_api(item) for item in items)
+        return invoices
+
+    def check_invoice_paid(self, invoice_id: int, update_from_api: bool = False) -> bool or None:
+        """Проверяет оплату инвойса.
+
+        По умолчанию отвечает из локального состояния. Проверку по запросу
+        пользователя нужно делать с update_from_api=True: опрашивает только
+        воркер-лидер, у остальных локальный статус не обновляется.
+        """
+        return self.invoice_manager.is_paid(invoice_id, update_from_api)
 
     # === ТРАНЗАКЦИИ (TRANSFER) ===
 
@@ -691,23 +937,81 @@ class CryptoBotAPI:
         return result if result else None
 
 
+class TokenBucket:
+    """Корзина токенов: до capacity запросов подряд, пополнение rate токенов в секунду"""
+
+    def __init__(self, capacity: int, rate: float):
+        self.capacity = float(capacity)
+        self.rate = float(rate)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        """Забирает токен за O(1).
+
+        Returns:
+            float: 0, если токен получен, иначе сколько секунд ждать следующего.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def refund(self):
+        """Возвращает токен, если запрос так и не был выполнен"""
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+
 class RateLimiter:
-    """Простой rate limiter"""
+    """Потокобезопасный rate limiter на корзинах токенов.
+
+    Общий лимит действует на все запросы, method_limits задают отдельные
+    бюджеты для методов API. В блокирующем режиме запрос ждет токен не дольше
+    max_wait_seconds, а не отклоняется сразу.
+    """
 
-    def __init__(self, max_requests: int = 100, window_seconds: int = 60):
+    def __init__(self, max_requests: int = 100, window_seconds: int = 60,
+                 method_limits: Optional[Dict[str, Tuple[int, int]]] = None,
+                 block: bool = False, max_wait_seconds: float = 5):
         self.max_requests = max_requests
         self.window_seconds = window_seconds
-        self.requests = []
+        self.block = block
+        self.max_wait_seconds = max_wait_seconds
+        self.bucket = TokenBucket(max_requests, max_requests / window_seconds)
+        self.method_buckets: Dict[str, TokenBucket] = {
+            method: TokenBucket(requests_count, requests_count / window)
+            for method, (requests_count, window) in (method_limits or {}).items()
+        }
+
+    def _try_acquire(self, method: Optional[str]) -> float:
+        method_bucket = self.method_buckets.get(method)
+        if method_bucket:
+            wait = method_bucket.try_acquire()
+            if wait:
+                return wait
 
-    def allow_request(self) -> bool:
-        """Проверяет, можно ли выполнить запрос"""
-        now = time.time()
+        wait = self.bucket.try_acquire()
+        if wait and method_bucket:
+            method_bucket.refund()
+        return wait
 
-        # Удаляем старые запросы
-        self.requests = [req for req in self.requests if now - req < self.window_seconds]
+    def allow_request(self, method: Optional[str] = None, block: Optional[bool] = None) -> bool:
+        """Проверяет, можно ли выполнить запрос, и забирает токен"""
+        block = self.block if block is None else block
+        deadline = time.monotonic() + self.max_wait_seconds
 
-        if len(self.requests) < self.max_requests:
-            self.requests.append(now)
-            return True
+        while True:
+            wait = self._try_acquire(method)
+            if not wait:
+                return True
 
-        return False
\ No newline at end of file
+            if not block or time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
@@ -0,0 +1,108 @@
+import random
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from ..config import Config
+from . import Logger
+
+logger = Logger("HttpTransport")
+
+class HttpTransport:
+    """Пул keep-alive сессий requests, по одной на хост.
+
+    Сессии общие для всех потоков. Таймауты задаются на хост, сетевые ошибки
+    повторяются с экспоненциальной задержкой и джиттером. Неидемпотентные
+    запросы (POST) повторяются только если соединение не было установлено.
+    """
+
+    IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+    RETRY_STATUSES = {502, 503, 504}
+
+    def __init__(self, pool_connections: int = 4, pool_maxsize: int = 16,
+                 retries: int = 2, backoff_seconds: float = 0.3,
+                 timeout: Tuple[float, float] = (3.05, 10)):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self.default_timeout = timeout
+        self.timeouts: Dict[str, Tuple[float, float]] = {}  # host -> (connect, read)
+        self.sessions: Dict[str, requests.Session] = {}
+        self.lock = threading.Lock()
+
+    def set_timeout(self, host: str, connect: float, read: float):
+        """Задает таймауты подключения и чтения для хоста"""
+        self.timeouts[host] = (connect, read)
+
+    def session(self, host: str) -> requests.Session:
+        """Возвращает сессию хоста, создавая её при первом обращении"""
+        session = self.sessions.get(host)
+        if session is not None:
+            return session
+
+        with self.lock:
+            if host not in self.sessions:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.pool_connections,
+                                      pool_maxsize=self.pool_maxsize,
+                                      pool_block=False)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self.sessions[host] = session
+                logger.debug("Создана сессия для %s: pool_maxsize[%s]", host, self.pool_maxsize)
+            return self.sessions[host]
+
+    def _backoff(self, attempt: int) -> float:
+        return self.backoff_seconds * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+    def request(self, method: str, url: str, timeout: Optional[Tuple[float, float]] = None,
+                **kwargs) -> requests.Response:
+        """Выполняет запрос через сессию хоста с повторами.
+
+        Raises:
+            requests.exceptions.RequestException: Если все попытки не удались.
+        """
+        method = method.upper()
+        host = urlsplit(url).hostname
+        session = self.session(host)
+        timeout = timeout or self.timeouts.get(host, self.default_timeout)
+        idempotent = method in self.IDEMPOTENT_METHODS
+
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            try:
+                response = session.request(method, url, timeout=timeout, **kwargs)
+            except requests.exceptions.ConnectTimeout:
+                if last_attempt:
+                    raise
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if last_attempt or not idempotent:
+                    raise
+            else:
+                if last_attempt or not idempotent or response.status_code not in self.RETRY_STATUSES:
+                    return response
+
+            delay = self._backoff(attempt)
+            logger.warn(f"Повтор запроса {method} {host} через {delay:.2f} с, попытка {attempt + 2}")
+            time.sleep(delay)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        """Закрывает все сессии"""
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions.clear()
+
+transport = HttpTransport(pool_maxsize=Config.HTTP_POOL_MAXSIZE,
+                          retries=Config.HTTP_RETRIES,
+                          backoff_seconds=Config.HTTP_BACKOFF_SECONDS,
+                          timeout=(Config.HTTP_CONNECT_TIMEOUT, Config.HTTP_READ_TIMEOUT))
@@ -1,32 +1,154 @@
 import json
+import threading
 from pathlib import Path
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup
 from . import Logger
+from .product_snapshot import product_snapshot
 
 logger = Logger("Keyboard")
 
 class Keyboard:
-    """Единый класс для работы с клавишами из keyboard.json."""
+    """Единый класс для работы с клавишами из keyboard.json.
+
+    JSON читается один раз. Подписи товаров перерисовываются только при смене
+    версии снимка товаров (изменение цены, лимита или остатка), готовые
+    разметки кэшируются по набору действий до следующей перерисовки.
+    """
 
     def __init__(self):
         # Загружаем шаблоны из JSON
-        self.keyboard = None
-
-    def update_inline_keyboard(self, product_model):
         with open(Path(__file__).parents[2] / "keyboard.json", "r", encoding="utf-8") as f:
             self.keyboard = json.load(f)
 
+        self._label_templates = {}  # id кнопки select_order -> шаблон подписи
         for key in self.keyboard["inline"]:
+            key["callback_json"] = json.dumps(key["callback_data"])
             if key["callback_data"]["action"] == "select_order":
-                product = product_model.query.get(int(key["callback_data"]["id"]))
-                limit = product.account_limit
-                price = product.price
-                quantity = product.quantity
+                self._label_templates[key["callback_data"]["id"]] = key["text"]
+
+        self._layouts = {}  # frozenset(actions) -> InlineKeyboardMarkup
+        self._general_markup = None
+        self._rendered_version = -1
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def invalidate():
+        """Помечает подписи товаров устаревшими"""
+        product_snapshot.invalidate()
+
+    def update_inline_keyboard(self, product_model, force: bool = False):
+        """Перерисовывает подписи товаров, если с прошлой отрисовки были изменения"""
+        version, products = product_snapshot.load_versioned(product_model)
+        with self.lock:
+            if not force and self._rendered_version == version:
+                return
+
+            for key in self.keyboard["inline"]:
+                if key["callback_data"]["action"] == "select_order":
+                    product = products.get(int(key["callback_data"]["id"]))
+                    if product is None:
+                        logger.warn(f"Товар для кнопки {key['callback_data']['id']} не найден")
+                        continue
+
+                    key["text"] = self._label_templates[key["callback_data"]["id"]].format(
+                        limit_label = f"{product.account_limit: }",
+                        price_label = f"{product.price: }",
+                        quantity_label = f"{product.quantity: }"
+                    )
+
+            self._layouts.clear()
+            self._rendered_version = version
+            logger.debug("Подписи товаров перерисованы: version[%s]", version)
+
+    @staticmethod
+    def build_inline_markup(key_data: list[dict], urls: dict = None) -> InlineKeyboardMarkup:
+        """Собирает inline-клавиатуру по позициям кнопок.
+
+        Args:
+            key_data (list[dict]): Кнопки из keyboard.json.
+            urls (dict, optional): id кнопки -> url, такие кнопки становятся ссылками.
+        """
+        max_row_p = 0
+        max_row_n = 0
+        for key in key_data:
+            row = key["position"]["row"]
+            if row > max_row_p:
+                max_row_p = row
+            elif row < 0 and abs(row) > max_row_n:
+                max_row_n = abs(row)
+
+        keyboard = [[] for i in range(max_row_p)]
+        bottom_keys = [[] for i in range(max_row_n)]
+
+        for key in key_data:
+            row = key["position"]["row"]
+            column = key["position"]["column"]
+            url = urls.get(key["callback_data"].get("id")) if urls else None
+            if url:
+                inline_key = InlineKeyboardButton(key["text"], url=url)
+            else:
+                inline_key = InlineKeyboardButton(key["text"], callback_data=key["callback_json"])
+
+            if row < 0:
+                bottom_keys[abs(row) - 1].insert(abs(column) - 1, inline_key)
+                continue
 
-                key["text"] = key["text"].format(
-                    limit_label = f"{limit: }",
-                    price_label = f"{price: }",
-                    quantity_label = f"{quantity: }"
-                )
+            keyboard[row - 1].insert(column - 1, inline_key)
+
+        for bottom_key in bottom_keys:
+            keyboard.append(bottom_key)
+
+        return InlineKeyboardMarkup(keyboard)
+
+    def get_inline_markup(self, actions: list, urls: dict = None, labels: dict = None) -> InlineKeyboardMarkup:
+        """Возвращает inline-клавиатуру для набора действий.
+
+        Разметка без ссылок и своих подписей берется из кэша, иначе собирается заново.
+
+        Args:
+            labels (dict, optional): id кнопки -> текст, заменяющий текст из keyboard.json.
+        """
+        if urls or labels:
+            keys = self.get_inline_keys(actions)
+            if labels:
+                keys = [dict(key, text=labels[key["callback_data"]["id"]])
+                        if key["callback_data"].get("id") in labels else key
+                        for key in keys]
+            return self.build_inline_markup(keys, urls)
+
+        layout_key = frozenset(actions)
+        with self.lock:
+            markup = self._layouts.get(layout_key)
+            if markup is None:
+                markup = self.build_inline_markup(self.get_inline_keys(actions))
+                self._layouts[layout_key] = markup
+        return markup
+
+    def get_inline_keys(self, actions: list) -> list[dict]:
+        return [key for key in self.inline
+                if key["callback_data"]["action"] in actions]
+
+    @property
+    def quantity_options(self) -> list[str]:
+        """id кнопок выбора количества"""
+        return [key["callback_data"]["id"] for key in self.inline
+                if key["callback_data"]["action"] == "select_qty"]
+
+    @property
+    def asset_options(self) -> dict[str, str]:
+        """id кнопки выбора валюты -> название актива"""
+        return {key["callback_data"]["id"]: key["text"] for key in self.inline
+                if key["callback_data"]["action"] == "select_asset"}
+
+    @property
+    def general_markup(self) -> ReplyKeyboardMarkup:
+        if self._general_markup is None:
+            self._general_markup = ReplyKeyboardMarkup(
+                keyboard=self.general,
+                resize_keyboard=True,
+                one_time_keyboard=False
+            )
+        return self._general_markup
 
     @property
     def general(self):
@@ -36,4 +158,4 @@ class Keyboard:
     def inline(self):
         return self.keyboard["inline"]
 
-keyboard = Keyboard()
\ No newline at end of file
+keyboard = Keyboard()
@@ -0,0 +1,137 @@
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Optional
+from sqlalchemy import Column, Float, MetaData, String, Table, create_engine, insert, select, text, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.pool import NullPool
+from . import Logger
+
+logger = Logger("LeaderLock")
+
+metadata = MetaData()
+
+leases = Table(
+    "scheduler_leases", metadata,
+    Column("name", String(64), primary_key=True),
+    Column("holder", String(128), nullable=False),
+    Column("expires_at", Float, nullable=False),
+)
+
+class LeaderLock:
+    """Выбор одного ведущего процесса среди воркеров через БД.
+
+    В MySQL используется GET_LOCK на отдельном соединении: блокировка живет,
+    пока живо соединение, и освобождается сервером при падении процесса.
+    Для других СУБД (например, SQLite при локальной проверке) — аренда в
+    таблице scheduler_leases с продлением и сроком истечения.
+
+    renew() вызывается периодически; is_leader() только читает результат
+    последнего продления и не обращается к БД.
+    """
+
+    def __init__(self, engine: Engine, name: str, lease_seconds: float = 45):
+        # Отдельный движок без пула, чтобы соединение с блокировкой не занимало слот общего пула
+        self.engine = create_engine(engine.url, poolclass=NullPool)
+        self.name = name
+        self.lease_seconds = lease_seconds
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.advisory = self.engine.dialect.name in ("mysql", "mariadb")
+        self._connection: Optional[Connection] = None
+        self._table_ready = False
+        self._leader = False
+        self.lock = threading.Lock()
+
+    def is_leader(self) -> bool:
+        return self._leader
+
+    def renew(self) -> bool:
+        """Захватывает или подтверждает лидерство.
+
+        Returns:
+            bool: True, если этот процесс — ведущий.
+        """
+        with self.lock:
+            try:
+                leader = self._renew_advisory() if self.advisory else self._renew_lease()
+            except Exception as e:
+                logger.error(f"Ошибка продления лидерства {self.name}: {e}")
+                self._close()
+                leader = False
+
+            if leader != self._leader:
+                if leader:
+                    logger.info(f"Процесс {self.holder} стал ведущим для {self.name}")
+                else:
+                    logger.warn(f"Процесс {self.holder} больше не ведущий для {self.name}")
+            self._leader = leader
+            return leader
+
+    def _renew_advisory(self) -> bool:
+        if self._connection is None:
+            self._connection = self.engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+
+        if self._leader:
+            # Соединение то же, значит блокировка наша, пока сервер это подтверждает
+            owner = self._connection.execute(text("SELECT IS_USED_LOCK(:name) = CONNECTION_ID()"),
+                                             {"name": self.name}).scalar()
+            if owner:
+                return True
+
+        acquired = self._connection.execute(text("SELECT GET_LOCK(:name, 0)"), {"name": self.name}).scalar()
+        return acquired == 1
+
+    def _renew_lease(self) -> bool:
+        now = time.time()
+        with self.engine.begin() as connection:
+            if not self._table_ready:
+                metadata.create_all(connection, checkfirst=True)
+                self._table_ready = True
+            result = connection.execute(
+                update(leases)
+                .where(leases.c.name == self.name)
+                .where((leases.c.holder == self.holder) | (leases.c.expires_at < now))
+                .values(holder=self.holder, expires_at=now + self.lease_seconds)
+            )
+            if result.rowcount:
+                return True
+
+            exists = connection.execute(select(leases.c.name).where(leases.c.name == self.name)).first()
+            if exists:
+                return False
+
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(insert(leases).values(name=self.name, holder=self.holder,
+                                                         expires_at=now + self.lease_seconds))
+            return True
+        except IntegrityError:
+            # Другой процесс создал аренду одновременно с нами
+            return False
+
+    def release(self):
+        """Отдает лидерство, например при остановке процесса"""
+        with self.lock:
+            try:
+                if self.advisory and self._connection is not None:
+                    self._connection.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": self.name})
+                elif not self.advisory and self._leader:
+                    with self.engine.begin() as connection:
+                        connection.execute(leases.delete().where(leases.c.name == self.name,
+                                                                 leases.c.holder == self.holder))
+            except Exception as e:
+                logger.error(f"Ошибка освобождения лидерства {self.name}: {e}")
+            finally:
+                self._close()
+                self._leader = False
+
+    def _close(self):
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Exception:
+                pass
+            self._connection = None
@@ -1,96 +1,245 @@
+import atexit
 import logging
+import logging.handlers
+import queue
 import sys
 import os
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
 from app.config import Config
 
+FORMAT = '[%(asctime)s] [%(name)s/%(levelname)s]: %(message)s'
+DATE_FORMAT = '%H:%M:%S'
+
+class DailyFileHandler(logging.Handler):
+    """Один файл log_YYYY-MM-DD.log на все логгеры процесса.
+
+    Файл переключается фоновым потоком в полночь, а не при каждой записи;
+    после переключения удаляются старые файлы сверх max_files.
+    """
+
+    def __init__(self, directory: str, max_files: int):
+        super().__init__()
+        self.directory = directory
+        self.max_files = max_files
+        self._handler = None
+        self._stop = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+        self.rotate()
+        self._thread = threading.Thread(target=self._run, name="log-rotation", daemon=True)
+        self._thread.start()
+
+    def rotate(self):
+        """Открывает файл текущего дня и закрывает предыдущий"""
+        log_path = os.path.join(self.directory, f"log_{datetime.now().strftime('%Y-%m-%d')}.log")
+        handler = logging.FileHandler(log_path, encoding='utf-8')
+        handler.setFormatter(logging.Formatter(FORMAT, datefmt=DATE_FORMAT))
+
+        self.acquire()
+        try:
+            previous, self._handler = self._handler, handler
+        finally:
+            self.release()
+        if previous is not None:
+            previous.close()
+
+        self._manage_log_files()
+
+    def _run(self):
+        while True:
+            now = datetime.now()
+            midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+            if self._stop.wait((midnight - now).total_seconds()):
+                return
+            try:
+                self.rotate()
+            except Exception as e:
+                sys.stderr.write(f"Ошибка переключения лог-файла: {e}\n")
+
+    def _manage_log_files(self):
+        """Проверяет количество файлов логов и удаляет старые, если их больше max_files"""
+        log_files = [os.path.join(self.directory, f) for f in os.listdir(self.directory)
+                     if f.startswith("log_") and f.endswith(".log")]
+
+        if len(log_files) > self.max_files:
+            log_files.sort(key=os.path.getmtime)
+            for file in log_files[:len(log_files) - self.max_files]:
+                try:
+                    os.remove(file)
+                except OSError as e:
+                    sys.stderr.write(f"Ошибка при удалении старого лог-файла {file}: {e}\n")
+
+    def emit(self, record):
+        # Вызывается только из потока QueueListener, блокировка — от rotate()
+        self._handler.emit(record)
+
+    def close(self):
+        self._stop.set()
+        self.acquire()
+        try:
+            if self._handler is not None:
+                self._handler.close()
+        finally:
+            self.release()
+        super().close()
+
+
+class LogBackend:
+    """Общая очередь логов процесса.
+
+    Логгеры только кладут запись в очередь через QueueHandler; запись в
+    консоль и файл выполняет поток QueueListener, поэтому обработчики
+    обновлений не ждут ввода-вывода.
+    """
+
+    def __init__(self, max_files: int):
+        self.queue = queue.SimpleQueue()
+        self.queue_handler = logging.handlers.QueueHandler(self.queue)
+
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(logging.Formatter(FORMAT, datefmt=DATE_FORMAT))
+        handlers = [console_handler]
+        if Config.LOGS_DIR_PATH:
+            handlers.append(DailyFileHandler(Config.LOGS_DIR_PATH, max_files))
+
+        self.handlers = handlers
+        self.listener = logging.handlers.QueueListener(self.queue, *handlers)
+        self.listener.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Дописывает оставшиеся записи и закрывает файлы"""
+        if self.listener is None:
+            return
+        self.listener.stop()
+        self.listener = None
+        for handler in self.handlers:
+            handler.close()
+
+
+class Lazy:
+    """Отложенное значение для аргументов лога: func(*args) вызывается, только если запись будет выведена"""
+
+    __slots__ = ("func", "args")
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+    def __str__(self):
+        return str(self.func(*self.args))
+
+
+class Fields:
+    """Структурированные поля записи, выводятся как key[value]"""
+
+    __slots__ = ("fields",)
+
+    def __init__(self, fields: dict):
+        self.fields = fields
+
+    def __str__(self):
+        return " ".join(f"{key}[{value}]" for key, value in self.fields.items())
+
+
 class Logger:
-    """Класс для логирования в консоль и файл с разными уровнями сообщений"""
+    """Класс для логирования в консоль и файл с разными уровнями сообщений.
+
+    Сообщение форматируется только если уровень включен: аргументы
+    передаются в стиле logging ("%s", value), дорогие значения — через
+    Lazy, а именованные аргументы выводятся как поля key[value] и доступны
+    обработчикам в record.fields. Уровень логгера задается Config.LOG_LEVELS
+    по имени, иначе аргументом level, иначе Config.LOG_LEVEL.
+    """
 
     _instances = {}
+    _backend = None
+    _backend_lock = threading.Lock()
     MAX_LOG_FILES = 10
+    LOGGING_KWARGS = frozenset(("exc_info", "stack_info", "stacklevel", "extra"))
 
-    def __new__(cls, name="Bot", level=logging.INFO):
+    def __new__(cls, name="Bot", level=None):
         if name not in cls._instances:
             instance = super().__new__(cls)
             cls._instances[name] = instance
         return cls._instances[name]
 
-    def __init__(self, name="Bot", level=logging.INFO):
+    def __init__(self, name="Bot", level=None):
         if hasattr(self, 'logger'):
             return
 
+        resolved, invalid = self._resolve_level(name, level)
         self.logger = logging.getLogger(name)
-        self.logger.setLevel(level)
+        self.logger.setLevel(resolved)
 
         if self.logger.handlers:
             self.logger.handlers.clear()
 
-        formatter = logging.Formatter(
-            '[%(asctime)s] [%(name)s/%(levelname)s]: %(message)s',
-            datefmt='%H:%M:%S'
-        )
+        self.logger.addHandler(self.backend().queue_handler)
 
-        console_handler = logging.StreamHandler(sys.stdout)
-        console_handler.setFormatter(formatter)
-        self.logger.addHandler(console_handler)
+        for value in invalid:
+            self.warn("Неизвестный уровень логов \"%s\" для %s, используется %s",
+                      value, name, logging.getLevelName(resolved))
+        self.info("Логгер инициализирован с именем %s и уровнем %s", name, logging.getLevelName(self.logger.level))
+
+    @staticmethod
+    def _parse_level(value) -> Optional[int]:
+        """Уровень по числу или имени ("DEBUG", "warning", "10"), None для неизвестного"""
+        if isinstance(value, int):
+            return value
+        value = str(value).strip().upper()
+        if value.isdigit():
+            return int(value)
+        level = logging.getLevelName(value)
+        return level if isinstance(level, int) else None
 
-        # Инициализация данных для файла
-        self._current_date = None
-        self._file_handler = None
-        self._update_file_handler()  # Создаём первый файл при инициализации
+    @classmethod
+    def _resolve_level(cls, name: str, level) -> Tuple[int, List[str]]:
+        """Выбирает первый корректный уровень: LOG_LEVELS[name], level, LOG_LEVEL, INFO.
 
-        self.info(f"Логгер инициализирован с именем {name} и уровнем {logging.getLevelName(level)}")
+        Returns:
+            tuple: Уровень и отброшенные некорректные значения, чтобы предупредить о них.
+        """
+        candidates = [Config.LOG_LEVELS.get(name), level, Config.LOG_LEVEL]
+        invalid = []
+        for value in candidates:
+            if value is None:
+                continue
+            parsed = cls._parse_level(value)
+            if parsed is not None:
+                return parsed, invalid
+            invalid.append(str(value))
+        return logging.INFO, invalid
+
+    @classmethod
+    def backend(cls) -> LogBackend:
+        """Общий для всех логгеров бэкенд, создается при первом логгере"""
+        with cls._backend_lock:
+            if cls._backend is None:
+                cls._backend = LogBackend(cls.MAX_LOG_FILES)
+            return cls._backend
 
     @property
     def level(self):
         return self.logger.level
 
-    def _update_file_handler(self):
-        """Обновляет FileHandler для нового дня"""
-        new_date = datetime.now().strftime("%Y-%m-%d")
-        if self._current_date != new_date:
-            # Закрываем старый FileHandler, если он существует
-            if self._file_handler:
-                self._file_handler.close()
-                self.logger.removeHandler(self._file_handler)
-
-            # Создаём новую директорию и путь к файлу
-            os.makedirs(Config.LOGS_DIR_PATH, exist_ok=True)
-            log_file = f"log_{new_date}.log"
-            log_path = os.path.join(Config.LOGS_DIR_PATH, log_file)
-
-            # Создаём новый FileHandler
-            self._file_handler = logging.FileHandler(log_path, encoding='utf-8')
-            self._file_handler.setFormatter(logging.Formatter(
-                '[%(asctime)s] [%(name)s/%(levelname)s]: %(message)s',
-                datefmt='%H:%M:%S'
-            ))
-            self.logger.addHandler(self._file_handler)
-
-            # Обновляем текущую дату
-            self._current_date = new_date
-
-            # Управление количеством файлов
-            self._manage_log_files()
+    def is_enabled_for(self, level) -> bool:
+        return self.logger.isEnabledFor(level)
 
-    def _manage_log_files(self):
-        """Проверяет количество файлов логов и удаляет старые, если их больше MAX_LOG_FILES"""
-        log_files = [f for f in os.listdir(Config.LOGS_DIR_PATH) if f.startswith("log_") and f.endswith(".log")]
-        log_files = [os.path.join(Config.LOGS_DIR_PATH, f) for f in log_files]
+    def _log(self, level, message, *args, **kwargs):
+        if not self.logger.isEnabledFor(level):
+            return
 
-        if len(log_files) > self.MAX_LOG_FILES:
-            log_files.sort(key=os.path.getmtime)
-            files_to_delete = log_files[:len(log_files) - self.MAX_LOG_FILES]
-            for file in files_to_delete:
-                try:
-                    os.remove(file)
-                except OSError as e:
-                    self.logger.warning(f"Ошибка при удалении старого лог-файла {file}: {e}")
+        fields = {key: kwargs.pop(key) for key in list(kwargs) if key not in self.LOGGING_KWARGS}
+        if fields:
+            if not args:
+                # Без аргументов logging не подставляет %, а с полями — подставит
+                message = message.replace("%", "%%")
+            message = f"{message} %s"
+            args = (*args, Fields(fields))
+            kwargs["extra"] = {**kwargs.get("extra", {}), "fields": fields}
 
-    def _log(self, level, message, *args, **kwargs):
-        """Общая логика для всех уровней с проверкой даты"""
-        self._update_file_handler()  # Проверяем и обновляем файл перед записью
         self.logger.log(level, message, *args, **kwargs)
 
     def debug(self, message, *args, **kwargs):
@@ -106,4 +255,5 @@ class Logger:
         self._log(logging.ERROR, message, *args, **kwargs)
 
     def log_function_call(self, func_name):
-        self.debug(f"Вызов функции {func_name}")
\ No newline at end of file
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Вызов функции %s", func_name)
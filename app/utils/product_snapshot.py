@@ -0,0 +1,73 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from . import Logger
+from .templates import templates
+
+logger = Logger("ProductSnapshot")
+
+@dataclass(frozen=True)
+class ProductState:
+    """Неизменяемый снимок товара, не привязанный к сессии БД"""
+    product_id: int
+    account_limit: int
+    quantity: int
+    price: int
+
+
+class ProductSnapshot:
+    """Снимок каталога товаров, загружаемый одним запросом.
+
+    Общий для клавиатуры и фоновых задач. Перечитывается по истечении TTL
+    или после invalidate(); version растет при каждом изменении данных.
+    """
+
+    def __init__(self, ttl_seconds: float = 30):
+        self.ttl_seconds = ttl_seconds
+        self.products: Dict[int, ProductState] = {}
+        self.version = 0
+        self.loaded_at: Optional[float] = None
+        self.queries = 0
+        self.lock = threading.Lock()
+
+    def is_expired(self) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > self.ttl_seconds
+
+    def invalidate(self):
+        """Сбрасывает снимок после изменения товаров"""
+        with self.lock:
+            self.loaded_at = None
+            self.version += 1
+
+    def load(self, product_model, force: bool = False) -> Dict[int, ProductState]:
+        """Возвращает товары по id, перечитывая их при необходимости"""
+        return self.load_versioned(product_model, force)[1]
+
+    def load_versioned(self, product_model, force: bool = False) -> Tuple[int, Dict[int, ProductState]]:
+        """Как load(), но вместе с версией, согласованной с возвращаемыми данными"""
+        with self.lock:
+            if not force and not self.is_expired():
+                return self.version, self.products
+
+            rows = product_model.query.with_entities(
+                product_model.product_id,
+                product_model.account_limit,
+                product_model.quantity,
+                product_model.price
+            ).all()
+            self.queries += 1
+
+            products = {row.product_id: ProductState(*row) for row in rows}
+            if products != self.products:
+                self.products = products
+                self.version += 1
+            self.loaded_at = time.monotonic()
+
+            logger.debug("Снимок товаров загружен: count[%s] version[%s]", len(products), self.version)
+            return self.version, self.products
+
+    def get(self, product_model, product_id: int) -> Optional[ProductState]:
+        return self.load(product_model).get(product_id)
+
+product_snapshot = ProductSnapshot(ttl_seconds=templates.get("vars", "product_snapshot_ttl_seconds"))
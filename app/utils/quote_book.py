@@ -0,0 +1,106 @@
+import threading
+from typing import Dict, List, Optional, Tuple
+from . import Logger
+from .keyboard import keyboard
+from .product_snapshot import product_snapshot
+
+logger = Logger("QuoteBook")
+
+class QuoteBook:
+    """Готовые цены для каждой комбинации (товар, количество, актив).
+
+    Пересчитывается целиком только из слушателей обновления курсов и
+    изменения товаров, так что экран выбора валюты и set_order берут сумму
+    из словаря без конвертации. Если ключа нет (например, товар добавлен
+    после пересчета), сумма считается по матрице курсов только для него.
+    """
+
+    SOURCE_CURRENCY = "RUB"
+
+    def __init__(self, crypto_bot, product_model):
+        self.crypto_bot = crypto_bot
+        self.product_model = product_model
+        self.quotes: Dict[Tuple[int, int, str], float] = {}  # (product_id, quantity, asset) -> сумма
+        self._built_for = None  # (цены товаров, матрица курсов)
+        self.lock = threading.Lock()
+
+    def refresh(self, force: bool = False) -> bool:
+        """Пересчитывает котировки, если с прошлого раза изменились курсы или цены.
+
+        Изменение одних остатков котировки не затрагивает и пересчета не вызывает.
+
+        Returns:
+            bool: True, если котировки были пересчитаны.
+        """
+        products = product_snapshot.load(self.product_model)
+        matrix = self.crypto_bot.rate_matrix
+        prices = {product.product_id: product.price for product in products.values()}
+
+        with self.lock:
+            if not force and self._built_for is not None and \
+                    self._built_for[0] == prices and self._built_for[1] is matrix:
+                return False
+
+            quantities = [int(option) for option in keyboard.quantity_options]
+            assets = list(keyboard.asset_options.values())
+            amounts = {
+                (product.product_id, quantity): product.price * quantity
+                for product in products.values()
+                for quantity in quantities
+            }
+
+            quotes = {}
+            for (product_id, quantity), by_asset in matrix.convert_many(
+                    amounts, self.SOURCE_CURRENCY, assets).items():
+                for asset, amount in by_asset.items():
+                    if amount is not None:
+                        quotes[(product_id, quantity, asset)] = amount
+
+            self.quotes = quotes
+            self._built_for = (prices, matrix)
+
+        logger.debug("Котировки пересчитаны: %s шт.", len(quotes))
+        return True
+
+    def _convert(self, product_id: int, quantity: int, assets: List[str],
+                 price: Optional[int] = None) -> Dict[str, float]:
+        """Считает суммы для ключа, которого нет в котировках, без пересчета всей таблицы"""
+        if price is None:
+            product = product_snapshot.get(self.product_model, product_id)
+            if product is None:
+                return {}
+            price = product.price
+        converted = self.crypto_bot.rate_matrix.convert_many(
+            {product_id: price * quantity}, self.SOURCE_CURRENCY, assets).get(product_id, {})
+        return {asset: amount for asset, amount in converted.items() if amount is not None}
+
+    def get(self, product_id: int, quantity: int, asset: str, price: Optional[int] = None) -> Optional[float]:
+        """Возвращает сумму в активе или None, если курсы непригодны или пары нет.
+
+        price — цена товара, по которой будет оформлен заказ. Если котировки
+        построены по другой цене (ее изменили после пересчета), сумма
+        считается заново по переданной цене.
+        """
+        if not self.crypto_bot.ensure_rates():
+            return None
+        # _built_for присваивается после quotes: читаем в обратном порядке
+        built_for = self._built_for
+        if price is not None and (built_for is None or built_for[0].get(product_id) != price):
+            return self._convert(product_id, quantity, [asset], price).get(asset)
+        amount = self.quotes.get((product_id, quantity, asset))
+        if amount is None:
+            amount = self._convert(product_id, quantity, [asset]).get(asset)
+        return amount
+
+    def get_for_assets(self, product_id: int, quantity: int) -> Dict[str, float]:
+        """Возвращает суммы во всех активах для товара и количества"""
+        if not self.crypto_bot.ensure_rates():
+            return {}
+        quotes = self.quotes
+        assets = list(keyboard.asset_options.values())
+        found = {asset: quotes[(product_id, quantity, asset)]
+                 for asset in assets if (product_id, quantity, asset) in quotes}
+        missing = [asset for asset in assets if asset not in found]
+        if missing:
+            found.update(self._convert(product_id, quantity, missing))
+        return found
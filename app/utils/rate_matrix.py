@@ -0,0 +1,87 @@
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+class RateMatrix:
+    """Плотная матрица курсов: rates[i][j] — сколько единиц j дают за единицу i.
+
+    Строится один раз на каждое обновление курсов: прямые курсы из API,
+    обратные к ним и кросс-курсы через опорные валюты (USDT, USD). После
+    этого любой курс — два поиска в словаре и индексация списка.
+    """
+
+    PIVOTS = ("USDT", "USD")
+
+    def __init__(self, currencies: Sequence[str], rates: List[List[Optional[float]]]):
+        self.currencies = list(currencies)
+        self.index: Dict[str, int] = {currency: i for i, currency in enumerate(self.currencies)}
+        self.rates = rates
+
+    @classmethod
+    def empty(cls) -> "RateMatrix":
+        return cls([], [])
+
+    @classmethod
+    def build(cls, pairs: Iterable[Tuple[str, str, float]]) -> "RateMatrix":
+        """Строит матрицу из троек (source, target, rate)"""
+        pairs = [(source, target, float(rate)) for source, target, rate in pairs if rate and float(rate) > 0]
+        currencies = sorted({currency for source, target, _ in pairs for currency in (source, target)})
+        index = {currency: i for i, currency in enumerate(currencies)}
+        size = len(currencies)
+        rates: List[List[Optional[float]]] = [[None] * size for _ in range(size)]
+
+        for i in range(size):
+            rates[i][i] = 1.0
+
+        # Прямые курсы имеют приоритет над вычисленными
+        for source, target, rate in pairs:
+            rates[index[source]][index[target]] = rate
+
+        for source, target, rate in pairs:
+            i, j = index[source], index[target]
+            if rates[j][i] is None:
+                rates[j][i] = 1.0 / rate
+
+        # Сначала достраиваем строки опорных валют, чтобы через них считать остальные
+        pivots = [index[pivot] for pivot in cls.PIVOTS if pivot in index]
+        for i in pivots + [i for i in range(size) if i not in pivots]:
+            row = rates[i]
+            for j in range(size):
+                if row[j] is not None:
+                    continue
+                for p in pivots:
+                    if row[p] is not None and rates[p][j] is not None:
+                        row[j] = row[p] * rates[p][j]
+                        break
+
+        return cls(currencies, rates)
+
+    def __contains__(self, currency: str) -> bool:
+        return currency in self.index
+
+    def rate(self, source: str, target: str) -> Optional[float]:
+        """Курс source -> target или None, если его нельзя вывести"""
+        i = self.index.get(source)
+        j = self.index.get(target)
+        if i is None or j is None:
+            return None
+        return self.rates[i][j]
+
+    def convert(self, amount: float, source: str, target: str) -> Optional[float]:
+        rate = self.rate(source, target)
+        return amount * rate if rate is not None else None
+
+    def convert_many(self, amounts: Dict[Hashable, float], source: str,
+                     targets: Sequence[str]) -> Dict[Hashable, Dict[str, Optional[float]]]:
+        """Переводит набор сумм из source во все targets за один проход.
+
+        Returns:
+            dict: ключ суммы -> {валюта: сумма или None}.
+        """
+        i = self.index.get(source)
+        row = self.rates[i] if i is not None else None
+        columns = [(target, self.index.get(target)) for target in targets]
+        factors = [(target, row[j] if row is not None and j is not None else None) for target, j in columns]
+
+        return {
+            key: {target: amount * factor if factor is not None else None for target, factor in factors}
+            for key, amount in amounts.items()
+        }
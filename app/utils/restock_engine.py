@@ -0,0 +1,94 @@
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Tuple
+from . import Logger
+
+logger = Logger("RestockEngine")
+
+@dataclass(frozen=True)
+class RestockPolicy:
+    """Правило пополнения одного товара"""
+    max_qty: int
+    range_qty: Tuple[int, int]
+    range_seconds: Tuple[int, int]
+    skip_chance: float = 0.0  # Вероятность пропустить пополнение в свой срок
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Dict[str, Any]]) -> Dict[int, "RestockPolicy"]:
+        """Читает правила из templates.json: {"product_id": {...}} -> {product_id: RestockPolicy}"""
+        return {
+            int(product_id): cls(
+                max_qty=int(policy["max_qty"]),
+                range_qty=tuple(policy["range_qty"]),
+                range_seconds=tuple(policy["range_seconds"]),
+                skip_chance=float(policy.get("skip_chance", 0.0))
+            )
+            for product_id, policy in config.items()
+        }
+
+    def next_delay(self) -> float:
+        return random.uniform(*self.range_seconds)
+
+    def draw(self) -> int:
+        if self.skip_chance and random.random() < self.skip_chance:
+            return 0
+        return random.randint(*self.range_qty)
+
+
+class RestockEngine:
+    """Пополнение остатков по расписанию каждого товара.
+
+    tick() вызывается планировщиком с коротким интервалом, выбирает товары,
+    у которых подошел срок, и применяет все пополнения одним UPDATE. Если
+    остатки изменились, слушатели получают уведомление.
+    """
+
+    def __init__(self, product_model, policies: Dict[int, RestockPolicy]):
+        self.product_model = product_model
+        self.policies = policies
+        now = time.monotonic()
+        self.next_run: Dict[int, float] = {product_id: now for product_id in policies}
+        self.listeners: List[Callable[["RestockEngine"], None]] = []
+        self.lock = threading.Lock()
+
+    def add_listener(self, listener: Callable[["RestockEngine"], None]):
+        """Подписывает listener на изменение остатков после пополнения"""
+        self.listeners.append(listener)
+
+    def _due(self) -> Tuple[Dict[int, int], Dict[int, int]]:
+        """Выбирает товары со сроком пополнения и переносит их следующий запуск"""
+        now = time.monotonic()
+        increments, caps = {}, {}
+        with self.lock:
+            for product_id, policy in self.policies.items():
+                if self.next_run[product_id] > now:
+                    continue
+                self.next_run[product_id] = now + policy.next_delay()
+
+                increment = policy.draw()
+                if increment:
+                    increments[product_id] = increment
+                    caps[product_id] = policy.max_qty
+        return increments, caps
+
+    def tick(self) -> int:
+        """Пополняет товары, у которых подошел срок.
+
+        Returns:
+            int: Количество пополненных товаров.
+        """
+        increments, caps = self._due()
+        if not increments:
+            return 0
+
+        changed = self.product_model.restock_many(increments, caps)
+        if changed:
+            logger.info(f"Пополнено товаров: {changed} из {len(increments)}")
+            for listener in self.listeners:
+                try:
+                    listener(self)
+                except Exception as e:
+                    logger.error(f"Ошибка слушателя пополнения: {e}")
+        return changed
@@ -1,60 +1,349 @@
+import bisect
+import heapq
+import itertools
+import random
 import threading
 import time
-from typing import Callable
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Set
 from . import Logger
 
 logger = Logger("TaskScheduler")
 
-class TaskScheduler:
-    """Класс для управления фоновыми задачами (демонами)"""
+class IntervalTrigger:
+    """Запуск каждые seconds секунд плюс случайная задержка до jitter секунд"""
+
+    def __init__(self, seconds: float, jitter: float = 0):
+        self.seconds = seconds
+        self.jitter = jitter
+
+    def next_run(self, now: float) -> float:
+        return now + self.seconds + (random.uniform(0, self.jitter) if self.jitter else 0)
+
+    def __str__(self):
+        return f"каждые {self.seconds} с" + (f" (+{self.jitter} с)" if self.jitter else "")
+
+
+class CronTrigger:
+    """Запуск по cron-выражению из пяти полей: минута час день месяц день_недели.
+
+    Поддерживаются *, списки через запятую, диапазоны a-b и шаг /n. День
+    недели 0 или 7 — воскресенье. Время локальное.
+    """
+
+    FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression: str, jitter: float = 0):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"Cron expression must have 5 fields: \"{expression}\"")
+        self.expression = expression
+        self.jitter = jitter
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            self._parse(part, *bounds) for part, bounds in zip(parts, self.FIELDS))
+        self.weekdays = {day % 7 for day in weekdays}
+        self.any_day = parts[2] == "*"
+        self.any_weekday = parts[4] == "*"
+
+    @staticmethod
+    def _parse(field: str, low: int, high: int) -> Set[int]:
+        values = set()
+        for part in field.split(","):
+            step = 1
+            if "/" in part:
+                part, step = part.split("/")
+                step = int(step)
+            if part == "*":
+                start, end = low, high
+            elif "-" in part:
+                start, end = map(int, part.split("-"))
+            else:
+                start = end = int(part)
+            if start < low or end > high or step < 1:
+                raise ValueError(f"Cron field \"{field}\" out of range {low}-{high}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day = moment.day in self.days
+        weekday = (moment.isoweekday() % 7) in self.weekdays
+        # Как в cron: если ограничены оба поля, достаточно совпадения одного
+        if not self.any_day and not self.any_weekday:
+            return day or weekday
+        return day and weekday
+
+    def next_run(self, now: float) -> float:
+        moment = datetime.fromtimestamp(now).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=366 * 5)
+        while moment < limit:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment.timestamp() + (random.uniform(0, self.jitter) if self.jitter else 0)
+        raise ValueError(f"Cron expression never fires: \"{self.expression}\"")
+
+    def __str__(self):
+        return f"cron \"{self.expression}\""
+
+
+class RuntimeHistogram:
+    """Гистограмма длительности запусков задачи"""
+
+    BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
 
     def __init__(self):
-        self.threads = {}  # Словарь: {task_id: (thread, stop_event)}
-        self.lock = threading.Lock()  # Для безопасного доступа к threads
-
-    def start_task(self, task: Callable, interval_seconds: int, task_id: str):
-        """Запускает задачу в отдельном потоке с заданным интервалом и идентификатором"""
-        stop_event = threading.Event()
-        thread = threading.Thread(
-            target=self._run_scheduler,
-            args=(task, interval_seconds, stop_event),
-            daemon=True
-        )
-        with self.lock:
-            self.threads[task_id] = (thread, stop_event)
-        thread.start()
-        logger.info(f"Запущена задача {task.__name__} с ID {task_id} и интервалом {interval_seconds} секунд")
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        runs = sum(self.counts)
+        labels = [f"<={bucket}" for bucket in self.BUCKETS] + [f">{self.BUCKETS[-1]}"]
+        return {
+            "buckets": dict(zip(labels, self.counts)),
+            "avg": self.total / runs if runs else 0.0,
+            "max": self.max,
+        }
+
+
+class ScheduledTask:
+    """Задача планировщика и ее счетчики"""
+
+    def __init__(self, task_id: str, func: Callable, args: tuple, trigger, skip_if_running: bool,
+                 singleton: bool = False, executor: Optional[ThreadPoolExecutor] = None):
+        self.task_id = task_id
+        self.func = func
+        self.args = args
+        self.trigger = trigger  # None — однократный запуск
+        self.skip_if_running = skip_if_running
+        self.singleton = singleton  # Выполняется только в ведущем процессе
+        self.executor = executor  # Пул, в котором выполняется запуск
+        self.next_at: Optional[float] = None
+        self.seq = 0
+        self.running = False
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.not_leader = 0
+        self.histogram = RuntimeHistogram()
+
+    @property
+    def name(self) -> str:
+        return getattr(self.func, "__name__", repr(self.func))
+
+
+class TaskScheduler:
+    """Планировщик фоновых задач на одной куче сроков и общем пуле потоков.
+
+    Один поток ждет ближайший срок на Condition.wait(timeout) и отдает
+    задачу в пул потоков. Периодическая задача, предыдущий запуск которой
+    еще не закончился, по умолчанию пропускается. Удаление задачи — O(1):
+    устаревшие элементы кучи отбрасываются при извлечении.
+
+    Пулов три: периодические задачи, однократные (таймеры инвойсов,
+    обновление курсов) и отдельный поток для продления лидерства, чтобы
+    очередь медленных задач не задержала продление дольше срока аренды.
+    """
+
+    def __init__(self, workers: int = 4, name: str = "scheduler", leader=None,
+                 oneshot_workers: Optional[int] = None):
+        self.name = name
+        self.leader = leader  # LeaderLock для задач с singleton=True
+        self.tasks: Dict[str, ScheduledTask] = {}
+        self.heap = []  # (next_at, seq, task_id)
+        self.condition = threading.Condition()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-worker")
+        self.oneshot_executor = ThreadPoolExecutor(max_workers=oneshot_workers or workers,
+                                                   thread_name_prefix=f"{name}-once")
+        self.control_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{name}-control")
+        self._seq = itertools.count()
+        self._thread = None
+        self._stopped = False
+
+    def schedule(self, task: Callable, trigger, task_id: str, *args: Any,
+                 skip_if_running: bool = True, run_immediately: bool = False,
+                 singleton: bool = False) -> ScheduledTask:
+        """Регистрирует периодическую задачу. Задача с тем же task_id заменяется.
+
+        Args:
+            trigger: IntervalTrigger, CronTrigger или любой объект с next_run(now) -> float.
+            run_immediately: Выполнить первый запуск сразу, а не по триггеру.
+            singleton: Выполнять только в ведущем процессе (см. set_leader()).
+        """
+        entry = ScheduledTask(task_id, task, args, trigger, skip_if_running, singleton, self.executor)
+        first_at = time.time() if run_immediately else trigger.next_run(time.time())
+        self._push(entry, first_at)
+        logger.info(f"Запущена задача {entry.name} с ID {task_id}: {trigger}")
+        return entry
+
+    def start_task(self, task: Callable, interval_seconds: float, task_id: str,
+                   jitter: float = 0, skip_if_running: bool = True, singleton: bool = False):
+        """Запускает задачу сразу и затем каждые interval_seconds секунд"""
+        return self.schedule(task, IntervalTrigger(interval_seconds, jitter), task_id,
+                             skip_if_running=skip_if_running, run_immediately=True, singleton=singleton)
+
+    def set_leader(self, leader, renew_seconds: float = 15):
+        """Подключает выбор ведущего процесса и периодически продлевает лидерство.
+
+        Задачи с singleton=True выполняются только пока leader.is_leader().
+        При падении ведущего другой процесс перехватывает лидерство на
+        следующем продлении. Продление идет в отдельном потоке и не ждет
+        остальные задачи.
+        """
+        self.leader = leader
+        leader.renew()
+        trigger = IntervalTrigger(renew_seconds)
+        entry = ScheduledTask("leader_renew", leader.renew, (), trigger, skip_if_running=True,
+                              executor=self.control_executor)
+        self._push(entry, trigger.next_run(time.time()))
+        logger.info(f"Запущена задача {entry.name} с ID leader_renew: {trigger}")
+
+    def schedule_once(self, task: Callable, delay_seconds: float, task_id: str, *args: Any) -> ScheduledTask:
+        """Выполняет task(*args) один раз через delay_seconds. Повторный вызов с тем же task_id переносит срок"""
+        entry = ScheduledTask(task_id, task, args, None, skip_if_running=False, executor=self.oneshot_executor)
+        self._push(entry, time.time() + delay_seconds)
+        return entry
+
+    def _push(self, entry: ScheduledTask, next_at: float):
+        with self.condition:
+            if self._stopped:
+                return
+            self.tasks[entry.task_id] = entry
+            self._enqueue(entry, next_at)
+            self._compact()
+            self._ensure_thread()
+
+    def _enqueue(self, entry: ScheduledTask, next_at: float):
+        entry.next_at = next_at
+        entry.seq = next(self._seq)
+        heapq.heappush(self.heap, (next_at, entry.seq, entry.task_id))
+        if self.heap[0][1] == entry.seq:
+            self.condition.notify()
+
+    def _compact(self):
+        # Пересобираем кучу, если отмененных элементов стало больше живых
+        if len(self.heap) > 2 * len(self.tasks) + 64:
+            self.heap = [(entry.next_at, entry.seq, task_id) for task_id, entry in self.tasks.items()
+                         if entry.next_at is not None]
+            heapq.heapify(self.heap)
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def cancel(self, task_id: str) -> bool:
+        """Снимает задачу с расписания. Уже идущий запуск доработает до конца"""
+        with self.condition:
+            return self.tasks.pop(task_id, None) is not None
 
     def stop_task(self, task_id: str):
         """Останавливает задачу по её ID"""
-        with self.lock:
-            if task_id in self.threads:
-                thread, stop_event = self.threads[task_id]
-                stop_event.set()  # Сигнализируем потоку остановиться
-                thread.join()  # Ждём завершения потока
-                del self.threads[task_id]
-                logger.info(f"Задача с ID {task_id} остановлена")
-            else:
-                logger.warn(f"Задача с ID {task_id} не найдена")
+        if self.cancel(task_id):
+            logger.info(f"Задача с ID {task_id} остановлена")
+        else:
+            logger.warn(f"Задача с ID {task_id} не найдена")
 
-    @staticmethod
-    def _run_scheduler(task: Callable, interval_seconds: int, stop_event: threading.Event):
-        """Запускает задачу по расписанию, пока не будет установлен stop_event"""
-        while not stop_event.is_set():
-            try:
-                task()
-            except Exception as e:
-                logger.error(f"Ошибка в планировщике задачи {task.__name__}: {e}")
-            # Спим интервал, но проверяем stop_event каждую секунду
-            for _ in range(int(interval_seconds)):
-                if stop_event.is_set():
+    def _run(self):
+        while True:
+            with self.condition:
+                while True:
+                    if self._stopped:
+                        return
+                    if not self.heap:
+                        self.condition.wait()
+                        continue
+
+                    next_at, seq, task_id = self.heap[0]
+                    entry = self.tasks.get(task_id)
+                    if entry is None or entry.seq != seq:
+                        heapq.heappop(self.heap)
+                        continue
+
+                    timeout = next_at - time.time()
+                    if timeout > 0:
+                        self.condition.wait(timeout)
+                        continue
+
+                    heapq.heappop(self.heap)
                     break
-                time.sleep(1)
-
-    def stop_all(self):
-        """Останавливает все активные задачи"""
-        with self.lock:
-            task_ids = list(self.threads.keys())
-            for task_id in task_ids:
-                self.stop_task(task_id)
-        logger.info("Все задачи остановлены")
\ No newline at end of file
+
+                now = time.time()
+                if entry.trigger is None:
+                    del self.tasks[task_id]
+                    entry.next_at = None
+                else:
+                    # Пропущенные сроки не наверстываем: следующий считается от текущего момента
+                    self._enqueue(entry, entry.trigger.next_run(now))
+
+                if entry.singleton and self.leader is not None and not self.leader.is_leader():
+                    entry.not_leader += 1
+                    continue
+                if entry.running and entry.skip_if_running:
+                    entry.skipped += 1
+                    logger.warn(f"Задача {task_id} еще выполняется, запуск пропущен")
+                    continue
+                entry.running = True
+
+            try:
+                entry.executor.submit(self._call, entry)
+            except RuntimeError:
+                return
+
+    def _call(self, entry: ScheduledTask):
+        started = time.monotonic()
+        try:
+            entry.func(*entry.args)
+        except Exception as e:
+            entry.failures += 1
+            logger.error(f"Ошибка в планировщике задачи {entry.name}: {e}")
+        finally:
+            with self.condition:
+                entry.running = False
+                entry.runs += 1
+                entry.histogram.observe(time.monotonic() - started)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Счетчики и гистограммы длительности периодических задач"""
+        with self.condition:
+            return {
+                task_id: {
+                    "runs": entry.runs,
+                    "failures": entry.failures,
+                    "skipped": entry.skipped,
+                    "not_leader": entry.not_leader,
+                    "running": entry.running,
+                    "next_at": entry.next_at,
+                    "runtime": entry.histogram.snapshot(),
+                }
+                for task_id, entry in self.tasks.items() if entry.trigger is not None
+            }
+
+    def task_ids(self) -> List[str]:
+        with self.condition:
+            return list(self.tasks)
+
+    def stop_all(self, wait: bool = True):
+        """Останавливает все задачи и пулы потоков и отдает лидерство"""
+        with self.condition:
+            self._stopped = True
+            self.tasks.clear()
+            self.heap.clear()
+            self.condition.notify_all()
+        for executor in (self.executor, self.oneshot_executor, self.control_executor):
+            executor.shutdown(wait=wait)
+        if self.leader is not None:
+            self.leader.release()
+        logger.info("Все задачи остановлены")
@@ -0,0 +1,167 @@
+import queue
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Hashable, Optional
+from . import Logger
+
+logger = Logger("UpdateQueue")
+
+_STOP = object()
+
+class UpdateQueue:
+    """Ограниченная очередь обновлений Telegram с пулом воркеров.
+
+    Веб-хук кладет обновление в очередь и сразу отвечает 200, а воркеры
+    разбирают очередь в фоне. Если очередь заполнена, put() возвращает False,
+    и веб-хук отвечает ошибкой — Telegram повторит доставку позже.
+
+    У каждого пользователя своя очередь обновлений, а общий пул воркеров
+    берет пользователей из очереди готовых: пока одно обновление
+    пользователя выполняется, следующие его обновления ждут, а остальные
+    пользователи обрабатываются свободными воркерами. Медленное обновление
+    занимает один воркер и задерживает только своего пользователя.
+    """
+
+    def __init__(self, handler: Callable, workers: int = 4, maxsize: int = 1000,
+                 enqueue_timeout: float = 0.5):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.capacity = max(1, maxsize)
+        self.enqueue_timeout = enqueue_timeout
+        # Ключ есть в pending, пока у пользователя есть ожидающие или выполняемое обновление
+        self.pending: Dict[Hashable, Deque] = {}
+        self.ready = queue.Queue()  # Ключи пользователей, готовых к обработке
+        self.threads = []
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+        self.depth = 0
+        self._running = False
+
+        # Метрики обратного давления
+        self.enqueued = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.max_depth = 0
+
+    def start(self):
+        """Запускает общий пул воркеров"""
+        with self.lock:
+            if self._running:
+                return
+            self._running = True
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"update-worker-{index}", daemon=True)
+                self.threads.append(thread)
+                thread.start()
+        logger.info("Запущено %s воркеров обработки обновлений, размер очереди %s", self.workers, self.capacity)
+
+    @staticmethod
+    def _shard_key(update) -> Hashable:
+        """Ключ очередности: user_id отправителя, иначе update_id"""
+        user = getattr(update, "effective_user", None)
+        if user is not None:
+            return user.id
+        return getattr(update, "update_id", 0) or 0
+
+    def put(self, update) -> bool:
+        """Кладет обновление в очередь его пользователя.
+
+        Returns:
+            bool: False, если очередь остановлена или переполнена.
+        """
+        key = self._shard_key(update)
+        with self.condition:
+            if not self._running:
+                return False
+            if not self.condition.wait_for(lambda: self.depth < self.capacity or not self._running,
+                                           self.enqueue_timeout) or not self._running:
+                self.rejected += 1
+                logger.warn("Очередь обновлений переполнена: depth[%s] users[%s]", self.depth, len(self.pending))
+                return False
+
+            updates = self.pending.get(key)
+            if updates is None:
+                updates = self.pending[key] = deque()
+                self.ready.put(key)
+            updates.append(update)
+
+            self.depth += 1
+            self.enqueued += 1
+            self.max_depth = max(self.max_depth, self.depth)
+        return True
+
+    def _worker(self):
+        while True:
+            key = self.ready.get()
+            if key is _STOP:
+                return
+
+            with self.condition:
+                update = self.pending[key].popleft()
+                self.depth -= 1
+                self.condition.notify_all()
+
+            try:
+                self.handler(update)
+                processed = True
+            except Exception as e:
+                processed = False
+                logger.error("Ошибка обработки обновления: %s", e)
+
+            with self.condition:
+                if processed:
+                    self.processed += 1
+                else:
+                    self.failed += 1
+                # Следующее обновление пользователя встает в конец очереди готовых,
+                # чтобы активный пользователь не занимал воркер без очереди
+                if self.pending[key]:
+                    self.ready.put(key)
+                else:
+                    del self.pending[key]
+                    self.condition.notify_all()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Перестает принимать обновления и дожидается обработки уже принятых"""
+        with self.condition:
+            if not self._running:
+                return
+            self._running = False
+            self.condition.notify_all()
+            logger.info("Остановка воркеров, в очереди %s обновлений", self.depth)
+
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while self.pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+
+        for _ in self.threads:
+            self.ready.put(_STOP)
+        for thread in self.threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+        alive = sum(thread.is_alive() for thread in self.threads)
+        if alive or self.depth:
+            logger.warn("Не дождались %s воркеров, в очереди осталось %s обновлений", alive, self.depth)
+        else:
+            logger.info("Все воркеры остановлены")
+        self.threads.clear()
+
+    def stats(self) -> dict:
+        """Возвращает метрики очереди"""
+        with self.lock:
+            return {
+                "depth": self.depth,
+                "users": len(self.pending),
+                "capacity": self.capacity,
+                "workers": self.workers,
+                "enqueued": self.enqueued,
+                "rejected": self.rejected,
+                "processed": self.processed,
+                "failed": self.failed,
+                "max_depth": self.max_depth,
+            }
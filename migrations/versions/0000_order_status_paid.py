@@ -0,0 +1,34 @@
+"""Статус заказа PAID для подтверждения оплаты из веб-хука Crypto Pay
+
+Revision ID: 0000
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+from sqlalchemy.dialects import mysql
+
+revision = "0000"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+OLD_STATUSES = ("PENDING", "CANCELLED", "DELIVERED")
+STATUSES = ("PENDING", "PAID", "CANCELLED", "DELIVERED")
+
+
+def upgrade():
+    # MODIFY на тот же ENUM ничего не меняет, поэтому шаг безопасен и для базы из db.create_all()
+    op.alter_column("orders", "status",
+                    existing_type=mysql.ENUM(*OLD_STATUSES),
+                    type_=mysql.ENUM(*STATUSES),
+                    existing_nullable=False,
+                    existing_server_default="PENDING")
+
+
+def downgrade():
+    op.execute("UPDATE orders SET status = 'DELIVERED' WHERE status = 'PAID'")
+    op.alter_column("orders", "status",
+                    existing_type=mysql.ENUM(*STATUSES),
+                    type_=mysql.ENUM(*OLD_STATUSES),
+                    existing_nullable=False,
+                    existing_server_default="PENDING")
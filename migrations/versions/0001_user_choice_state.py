@@ -0,0 +1,93 @@
+"""Структурированный выбор пользователя вместо users.choice
+
+Миграции проверяют текущую схему: база, созданная db.create_all() по новым
+моделям, уже содержит эти колонки, и шаги для неё пропускаются.
+
+Revision ID: 0001
+Revises: 0000
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+revision = "0001"
+down_revision = "0000"
+branch_labels = None
+depends_on = None
+
+STAGES = ("select_order", "select_qty", "select_asset")
+
+users = sa.table(
+    "users",
+    sa.column("user_id"),
+    sa.column("choice"),
+    sa.column("choice_product_id"),
+    sa.column("choice_qty"),
+    sa.column("choice_asset_id"),
+)
+
+
+def _columns(table):
+    return {column["name"] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _parse_choice(choice):
+    """'select_order?1/select_qty?3/' -> [1, 3, None]"""
+    values = []
+    for part in (choice or "").split("/")[:len(STAGES)]:
+        if "?" not in part:
+            break
+        try:
+            values.append(int(part.split("?")[1]))
+        except ValueError:
+            break
+    return (values + [None] * len(STAGES))[:len(STAGES)]
+
+
+def upgrade():
+    columns = _columns("users")
+    if "choice_product_id" not in columns:
+        op.add_column("users", sa.Column("choice_product_id", mysql.SMALLINT(unsigned=True), nullable=True))
+        op.add_column("users", sa.Column("choice_qty", mysql.TINYINT(unsigned=True), nullable=True))
+        op.add_column("users", sa.Column("choice_asset_id", mysql.TINYINT(unsigned=True), nullable=True))
+
+    if "choice" in columns:
+        bind = op.get_bind()
+        rows = bind.execute(sa.select(users.c.user_id, users.c.choice).where(users.c.choice != "")).all()
+        params = []
+        for user_id, choice in rows:
+            product_id, qty, asset_id = _parse_choice(choice)
+            params.append({"uid": user_id, "product_id": product_id, "qty": qty, "asset_id": asset_id})
+
+        if params:
+            bind.execute(
+                users.update()
+                .where(users.c.user_id == sa.bindparam("uid"))
+                .values(choice_product_id=sa.bindparam("product_id"),
+                        choice_qty=sa.bindparam("qty"),
+                        choice_asset_id=sa.bindparam("asset_id")),
+                params
+            )
+        op.drop_column("users", "choice")
+
+
+def downgrade():
+    bind = op.get_bind()
+    op.add_column("users", sa.Column("choice", sa.TEXT(), nullable=False))
+
+    rows = bind.execute(sa.select(users.c.user_id, users.c.choice_product_id,
+                                  users.c.choice_qty, users.c.choice_asset_id)
+                        .where(users.c.choice_product_id.isnot(None))).all()
+    params = []
+    for user_id, *values in rows:
+        choice = "".join(f"{stage}?{value}/" for stage, value in zip(STAGES, values) if value is not None)
+        params.append({"uid": user_id, "value": choice})
+
+    if params:
+        bind.execute(users.update().where(users.c.user_id == sa.bindparam("uid"))
+                     .values(choice=sa.bindparam("value")), params)
+
+    op.drop_column("users", "choice_asset_id")
+    op.drop_column("users", "choice_qty")
+    op.drop_column("users", "choice_product_id")
@@ -0,0 +1,31 @@
+"""Составной индекс orders (user_id, status, order_id) для поиска ожидающего заказа
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+INDEX = "ix_orders_user_status_order"
+
+
+def _indexes(table):
+    return {index["name"] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    if INDEX not in _indexes("orders"):
+        op.create_index(INDEX, "orders", ["user_id", "status", "order_id"])
+
+
+def downgrade():
+    # Индекс покрывает внешний ключ user_id, без него MySQL не даст удалить новый индекс
+    if INDEX in _indexes("orders"):
+        op.create_index("ix_orders_user_id", "orders", ["user_id"])
+        op.drop_index(INDEX, table_name="orders")
@@ -0,0 +1,41 @@
+"""Снимок цены в заказе: unit_price, currency, asset, asset_amount
+
+Для существующих заказов цена за единицу восстанавливается из total_price.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+COLUMNS = ("unit_price", "currency", "asset", "asset_amount")
+
+
+def _columns(table):
+    return {column["name"] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    if "unit_price" in _columns("orders"):
+        return
+
+    op.add_column("orders", sa.Column("unit_price", mysql.INTEGER(unsigned=True), nullable=False, server_default="0"))
+    op.add_column("orders", sa.Column("currency", mysql.VARCHAR(8), nullable=False, server_default="RUB"))
+    op.add_column("orders", sa.Column("asset", mysql.VARCHAR(16), nullable=True))
+    op.add_column("orders", sa.Column("asset_amount", sa.DECIMAL(30, 12), nullable=True))
+
+    op.execute("UPDATE orders SET unit_price = ROUND(total_price / quantity) WHERE quantity > 0")
+
+
+def downgrade():
+    columns = _columns("orders")
+    for name in reversed(COLUMNS):
+        if name in columns:
+            op.drop_column("orders", name)
@@ -0,0 +1,29 @@
+"""Индекс orders (status, order_date) для поиска просроченных заказов
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+INDEX = "ix_orders_status_date"
+
+
+def _indexes(table):
+    return {index["name"] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    if INDEX not in _indexes("orders"):
+        op.create_index(INDEX, "orders", ["status", "order_date"])
+
+
+def downgrade():
+    if INDEX in _indexes("orders"):
+        op.drop_index(INDEX, table_name="orders")
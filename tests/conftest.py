@@ -0,0 +1,29 @@
+import pytest
+from flask import Flask
+from sqlalchemy.dialects.mysql import SMALLINT, TINYINT
+from sqlalchemy.ext.compiler import compiles
+from app import db
+import app.models  # noqa: F401  регистрирует модели в metadata
+
+
+# Модели описаны типами MySQL; SQLite хранит их как INTEGER
+@compiles(TINYINT, "sqlite")
+@compiles(SMALLINT, "sqlite")
+def _compile_small_int(element, compiler, **kw):
+    return "INTEGER"
+
+
+@pytest.fixture
+def flask_app(tmp_path):
+    """Flask-приложение без бота и сети на файловой SQLite, доступной из нескольких потоков"""
+    flask_app = Flask("tests")
+    flask_app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'test.db'}"
+    flask_app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {"connect_args": {"timeout": 30, "check_same_thread": False}}
+    db.init_app(flask_app)
+
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
@@ -0,0 +1,111 @@
+from types import SimpleNamespace
+import pytest
+from app import db
+from app.bot.contexts.bot_context import YSContext
+from app.models import ActiveOrder, Order, Product, StatusType, User, active_orders
+from app.utils import CryptoBotAPI, TaskScheduler
+
+
+class RecordingBot:
+    """Telegram-бот, запоминающий отредактированные сообщения вместо отправки"""
+
+    def __init__(self):
+        self.edited = []
+
+    def edit_message_text(self, **kwargs):
+        self.edited.append(kwargs)
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    active_orders.forget(1)
+    yield
+    active_orders.forget(1)
+
+
+@pytest.fixture
+def bot_app(flask_app):
+    scheduler = TaskScheduler(workers=1, name="test-scheduler")
+    crypto_bot = CryptoBotAPI(scheduler=scheduler)
+    crypto_bot.requests = []
+    # Вместо сети запоминаем вызовы Crypto Pay API
+    crypto_bot._execute = lambda method, params=None, use_get=False: crypto_bot.requests.append((method, params)) or True
+    flask_app.crypto_bot = crypto_bot
+    flask_app.bot = RecordingBot()
+    User(user_id=1, username="buyer").save()
+    yield flask_app
+    scheduler.stop_all()
+
+
+def make_update(user_id: int):
+    sender = SimpleNamespace(id=user_id, username="buyer")
+    return SimpleNamespace(message=SimpleNamespace(from_user=sender, chat_id=user_id), callback_query=None)
+
+
+def create_order(user_id: int, invoice_id: int) -> Order:
+    product_id = Product(quantity=10, price=100).save().product_id
+    return Order.priced(100, 1, "USDT", 1.25, user_id=user_id, product_id=product_id,
+                        invoice_id=invoice_id, message_id=invoice_id).save()
+
+
+def test_absence_is_not_cached(flask_app):
+    User(user_id=1, username="buyer").save()
+    assert active_orders.get(1) is None
+
+    # Заказ, созданный другим воркером, виден сразу
+    order = create_order(1, invoice_id=10)
+    assert active_orders.get(1) == ActiveOrder.from_order(order)
+
+
+def test_refresh_bypasses_stale_pointer(flask_app):
+    User(user_id=1, username="buyer").save()
+    cancelled = create_order(1, invoice_id=10)
+    active_orders.get(1)
+
+    # В другом воркере заказ отменен и создан новый, указатель здесь устарел
+    Order.transition(cancelled.order_id, StatusType.CANCELLED)
+    pending = create_order(1, invoice_id=11)
+
+    assert active_orders.refresh(1) == ActiveOrder.from_order(pending)
+    assert active_orders.get(1) == ActiveOrder.from_order(pending)
+
+
+def test_cancel_retries_against_fresh_row(bot_app):
+    stale = create_order(1, invoice_id=10)
+    active_orders.get(1)
+    Order.transition(stale.order_id, StatusType.CANCELLED)
+    pending = create_order(1, invoice_id=11)
+    pending_id, product_id = pending.order_id, pending.product_id
+    bot_app.crypto_bot.invoice_manager.add_invoice({"invoice_id": 11, "hash": "IV11", "status": "active"})
+
+    YSContext(make_update(1)).cancel_order()
+
+    db.session.expire_all()
+    assert db.session.get(Order, pending_id).status == StatusType.CANCELLED
+    assert db.session.get(Product, product_id).quantity == 11
+    assert bot_app.crypto_bot.requests == [("deleteInvoice", {"invoice_id": "11"})]
+    assert [edit["message_id"] for edit in bot_app.bot.edited] == [11]
+
+
+def test_cancel_deletes_invoice_unknown_to_this_worker(bot_app):
+    # Заказ и инвойс создал другой воркер: локальный менеджер о нем не знает
+    order = create_order(1, invoice_id=20)
+    order_id = order.order_id
+    assert 20 not in bot_app.crypto_bot.invoice_manager.invoices
+
+    YSContext(make_update(1)).cancel_order()
+
+    db.session.expire_all()
+    assert db.session.get(Order, order_id).status == StatusType.CANCELLED
+    assert bot_app.crypto_bot.requests == [("deleteInvoice", {"invoice_id": "20"})]
+
+
+def test_clear_drops_only_matching_order(flask_app):
+    User(user_id=1, username="buyer").save()
+    order = create_order(1, invoice_id=10)
+    active_orders.get(1)
+
+    active_orders.clear(1, order.order_id + 1)
+    assert 1 in active_orders.entries
+    active_orders.clear(1, order.order_id)
+    assert 1 not in active_orders.entries
@@ -0,0 +1,69 @@
+from types import SimpleNamespace
+from sqlalchemy import event
+from app import db
+from app.bot.contexts.base_context import BaseContext
+from app.models import ChoiceState, User, choice_store
+
+
+def test_set_stage_writes_through_and_resets_later_stages(flask_app):
+    User(user_id=1, username="buyer").save()
+
+    choice_store.set_stage(1, 1, 3)
+    choice_store.set_stage(1, 2, 2)
+    choice_store.set_stage(1, 3, 1)
+    assert choice_store.get(1) == ChoiceState(3, 2, 1)
+
+    choice_store.set_stage(1, 1, 4)
+    assert choice_store.get(1) == ChoiceState(4, None, None)
+
+
+def test_choice_is_visible_to_other_sessions_immediately(flask_app):
+    User(user_id=1, username="buyer").save()
+    choice_store.set_stage(1, 1, 5)
+
+    # Другой воркер — другая сессия и соединение
+    db.session.remove()
+    with db.engine.connect() as connection:
+        row = connection.execute(db.select(User.choice_product_id).where(User.user_id == 1)).one()
+    assert row.choice_product_id == 5
+
+
+def test_set_stage_is_one_update_without_select(flask_app):
+    User(user_id=1, username="buyer").save()
+    executed = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement.split()[0].upper())
+
+    event.listen(db.engine, "before_cursor_execute", count)
+    try:
+        choice_store.set_stage(1, 2, 3)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count)
+
+    assert executed == ["UPDATE"]
+
+
+def test_press_costs_one_write_and_at_most_one_read(flask_app):
+    User(user_id=1, username="buyer").save()
+    choice_store.set_stage(1, 1, 3)
+    sender = SimpleNamespace(id=1, username="buyer")
+    context = BaseContext(SimpleNamespace(message=SimpleNamespace(from_user=sender, chat_id=1), callback_query=None))
+    executed = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement.split()[0].upper())
+
+    event.listen(db.engine, "before_cursor_execute", count)
+    try:
+        # Нажатие на количество: запись, затем проверка остатка и экран валют читают выбор
+        context.choice_update(2, 2)
+        assert context._choice == (3, 2, None)
+        assert context._choice == (3, 2, None)
+        context.choice_update(3, 1)
+        assert context._choice == (3, 2, 1)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count)
+
+    assert executed == ["UPDATE", "SELECT", "UPDATE"]
+    assert choice_store.get(1) == ChoiceState(3, 2, 1)
@@ -0,0 +1,139 @@
+import hashlib
+import hmac
+import json
+from types import SimpleNamespace
+import pytest
+from app import db
+from app.bot.payments import setup_payment_listener
+from app.config import Config
+from app.models import Order, Product, StatusType, User
+from app.routes import crypto_pay_bp
+from app.utils import TaskScheduler
+from app.utils.crypto_bot_api import InvoiceManager
+
+TOKEN = "12345:test-token"
+INVOICE_ID = 777
+
+
+class RecordingBot:
+    """Telegram-бот, запоминающий отредактированные сообщения вместо отправки"""
+
+    def __init__(self):
+        self.edited = []
+
+    def edit_message_text(self, **kwargs):
+        self.edited.append(kwargs)
+
+
+def sign(body: bytes, token: str = TOKEN) -> str:
+    secret = hashlib.sha256(token.encode()).digest()
+    return hmac.new(secret, body, hashlib.sha256).hexdigest()
+
+
+@pytest.fixture
+def webhook_app(flask_app, monkeypatch):
+    monkeypatch.setattr(Config, "CRYPTO_BOT_TOKEN", TOKEN)
+    scheduler = TaskScheduler(workers=1, name="test-scheduler")
+    flask_app.register_blueprint(crypto_pay_bp)
+    flask_app.bot = RecordingBot()
+    flask_app.crypto_bot = SimpleNamespace(invoice_manager=InvoiceManager(SimpleNamespace(scheduler=scheduler)))
+    setup_payment_listener(flask_app)
+
+    User(user_id=1, username="buyer").save()
+    product_id = Product(quantity=10, price=100).save().product_id
+    Order.priced(100, 1, "USDT", 1.25, user_id=1, product_id=product_id,
+                 invoice_id=INVOICE_ID, message_id=42).save()
+
+    yield flask_app
+    scheduler.stop_all()
+
+
+def post(client, update: dict, signature: str = None):
+    body = json.dumps(update).encode()
+    return client.post("/crypto-pay/webhook", data=body, content_type="application/json",
+                       headers={"crypto-pay-api-signature": signature if signature is not None else sign(body)})
+
+
+def paid_update(invoice_id: int = INVOICE_ID) -> dict:
+    return {"update_id": 1, "update_type": "invoice_paid",
+            "payload": {"invoice_id": invoice_id, "status": "paid", "hash": "IVtest"}}
+
+
+def order_status():
+    db.session.expire_all()
+    return Order.query.filter_by(invoice_id=INVOICE_ID).one().status
+
+
+def test_valid_signature_confirms_order(webhook_app):
+    response = post(webhook_app.test_client(), paid_update())
+
+    assert response.status_code == 200
+    assert order_status() == StatusType.PAID
+    assert [edit["message_id"] for edit in webhook_app.bot.edited] == [42]
+
+
+def test_repeated_delivery_is_idempotent(webhook_app):
+    client = webhook_app.test_client()
+    assert post(client, paid_update()).status_code == 200
+    assert post(client, paid_update()).status_code == 200
+
+    assert order_status() == StatusType.PAID
+    assert len(webhook_app.bot.edited) == 1
+
+
+def test_bad_signature_is_rejected(webhook_app):
+    response = post(webhook_app.test_client(), paid_update(), signature=sign(b"other body"))
+
+    assert response.status_code == 401
+    assert order_status() == StatusType.PENDING
+    assert webhook_app.bot.edited == []
+
+
+def test_signature_with_other_token_is_rejected(webhook_app):
+    body = json.dumps(paid_update()).encode()
+    response = webhook_app.test_client().post("/crypto-pay/webhook", data=body, content_type="application/json",
+                                              headers={"crypto-pay-api-signature": sign(body, "other:token")})
+
+    assert response.status_code == 401
+    assert order_status() == StatusType.PENDING
+
+
+def test_other_update_types_are_ignored(webhook_app):
+    update = {**paid_update(), "update_type": "invoice_expired"}
+    response = post(webhook_app.test_client(), update)
+
+    assert response.status_code == 200
+    assert order_status() == StatusType.PENDING
+    assert webhook_app.bot.edited == []
+
+
+def test_failed_confirmation_returns_5xx_and_retry_confirms(webhook_app, monkeypatch):
+    transition = Order.transition.__func__
+
+    def failing_transition(cls, *args, **kwargs):
+        raise RuntimeError("database is gone")
+
+    monkeypatch.setattr(Order, "transition", classmethod(failing_transition))
+    client = webhook_app.test_client()
+    assert post(client, paid_update()).status_code == 500
+    assert order_status() == StatusType.PENDING
+
+    # Локально инвойс уже "paid", но повтор доставки все равно подтверждает заказ
+    monkeypatch.setattr(Order, "transition", classmethod(transition))
+    assert post(client, paid_update()).status_code == 200
+    assert order_status() == StatusType.PAID
+
+
+def test_user_check_asks_api_when_local_status_is_stale(webhook_app):
+    # Воркер не лидер: опроса нет, локально инвойс так и остался "active"
+    manager = webhook_app.crypto_bot.invoice_manager
+    manager.add_invoice({"invoice_id": INVOICE_ID, "hash": "IVtest", "status": "active"})
+    requested = []
+    manager.api.get_invoices = lambda **kwargs: requested.append(kwargs) or [paid_update()["payload"]]
+
+    assert manager.is_paid(INVOICE_ID) is False
+    assert requested == []
+
+    assert manager.is_paid(INVOICE_ID, update_from_api=True)
+    assert requested == [{"invoice_ids": str(INVOICE_ID), "count": 1}]
+    assert order_status() == StatusType.PAID
@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from app import db
+from app.bot import expired_orders
+from app.models import Order, Product, StatusType, User
+
+
+HOUR = 3600
+
+
+class FakeCryptoBot:
+    """Crypto Pay с заранее заданными статусами инвойсов"""
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.deleted = []
+
+    def fetch_invoices(self, invoice_ids):
+        return [SimpleNamespace(invoice_id=invoice_id, status=self.statuses[invoice_id]) for invoice_id in invoice_ids]
+
+    def delete_invoices(self, invoice_ids):
+        self.deleted.extend(invoice_ids)
+        return len(invoice_ids)
+
+
+class RecordingBot:
+    def __init__(self):
+        self.edited = []
+
+    def edit_message_text(self, **kwargs):
+        self.edited.append(kwargs)
+
+
+def create_order(product_id: int, invoice_id: int, age_seconds: int) -> Order:
+    return Order.priced(100, 1, "USDT", 1.0, user_id=1, product_id=product_id, invoice_id=invoice_id,
+                        message_id=invoice_id,
+                        order_date=datetime.utcnow() - timedelta(seconds=age_seconds)).save()
+
+
+@pytest.fixture
+def orders(flask_app):
+    User(user_id=1, username="buyer").save()
+    product_id = Product(quantity=8, price=100).save().product_id
+    for invoice_id in (11, 12):
+        create_order(product_id, invoice_id, age_seconds=2 * HOUR)
+    # Срок оплаты еще не вышел
+    create_order(product_id, 13, age_seconds=60)
+
+    flask_app.bot = RecordingBot()
+    flask_app.crypto_bot = FakeCryptoBot({11: "paid", 12: "active", 13: "active"})
+    return product_id
+
+
+def statuses():
+    db.session.expire_all()
+    return {order.invoice_id: order.status for order in Order.query.all()}
+
+
+def test_paid_invoices_are_confirmed_not_cancelled(flask_app, orders):
+    assert expired_orders.cancel_expired_orders(flask_app, expire_after=HOUR) == 1
+
+    assert statuses() == {11: StatusType.PAID, 12: StatusType.CANCELLED, 13: StatusType.PENDING}
+    assert flask_app.crypto_bot.deleted == [12]
+    assert db.session.get(Product, orders).quantity == 9
+    assert sorted(edit["message_id"] for edit in flask_app.bot.edited) == [11, 12]
+
+
+def test_failed_confirmation_keeps_order_pending(flask_app, orders, monkeypatch):
+    def failing_confirm(app, invoice_id):
+        raise RuntimeError("database is gone")
+
+    monkeypatch.setattr(expired_orders, "confirm_payment", failing_confirm)
+    expired_orders.cancel_expired_orders(flask_app, expire_after=HOUR)
+
+    assert statuses() == {11: StatusType.PENDING, 12: StatusType.CANCELLED, 13: StatusType.PENDING}
+
+
+def test_unknown_invoice_statuses_defer_cancellation(flask_app, orders):
+    flask_app.crypto_bot.fetch_invoices = lambda invoice_ids: None
+
+    assert expired_orders.cancel_expired_orders(flask_app, expire_after=HOUR) == 0
+    assert statuses() == {11: StatusType.PENDING, 12: StatusType.PENDING, 13: StatusType.PENDING}
+
+
+def test_expired_orders_are_paged_by_order_id(flask_app):
+    User(user_id=1, username="buyer").save()
+    product_id = Product(quantity=10, price=100).save().product_id
+    expired = [create_order(product_id, invoice_id, age_seconds=2 * HOUR).order_id for invoice_id in range(1, 6)]
+    create_order(product_id, 6, age_seconds=60)
+    paid = create_order(product_id, 7, age_seconds=2 * HOUR).order_id
+    Order.transition(paid, StatusType.PAID)
+
+    first = expired_orders._expired_orders(HOUR, after_id=0, limit=2)
+    assert [(row.order_id, row.invoice_id) for row in first] == [(expired[0], 1), (expired[1], 2)]
+
+    second = expired_orders._expired_orders(HOUR, after_id=first[-1].order_id, limit=2)
+    third = expired_orders._expired_orders(HOUR, after_id=second[-1].order_id, limit=2)
+    assert [row.order_id for row in second + third] == expired[2:]
+    assert expired_orders._expired_orders(HOUR, after_id=expired[-1], limit=2) == []
@@ -0,0 +1,80 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+from app.utils import HttpTransport
+
+CALLS = 1000
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Локальная замена API: keep-alive ответ, /slow отвечает через секунду"""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if self.path == "/slow":
+            time.sleep(1)
+        body = b'{"ok":true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_pooled_transport_reuses_connections(server):
+    url = f"http://127.0.0.1:{server.server_port}/api"
+    transport = HttpTransport(pool_maxsize=4, retries=0)
+
+    started = time.perf_counter()
+    for _ in range(CALLS):
+        assert transport.get(url).status_code == 200
+    pooled = time.perf_counter() - started
+    pooled_connections = server.connections
+    transport.close()
+
+    server.connections = 0
+    started = time.perf_counter()
+    for _ in range(CALLS):
+        assert requests.get(url, timeout=5).status_code == 200
+    unpooled = time.perf_counter() - started
+
+    print(f"\n{CALLS} calls: pooled {pooled * 1e3 / CALLS:.3f} ms/call over {pooled_connections} connection(s), "
+          f"unpooled {unpooled * 1e3 / CALLS:.3f} ms/call over {server.connections} connections")
+    assert pooled_connections == 1
+    assert server.connections == CALLS
+
+
+def test_per_host_timeout_overrides_default(server):
+    transport = HttpTransport(retries=0, timeout=(3, 5))
+    transport.set_timeout("127.0.0.1", 1, 0.2)
+
+    started = time.perf_counter()
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        transport.get(f"http://127.0.0.1:{server.server_port}/slow")
+    assert time.perf_counter() - started < 0.9
+    transport.close()
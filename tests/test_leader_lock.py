@@ -0,0 +1,47 @@
+import time
+import pytest
+from sqlalchemy import create_engine
+from app.utils import LeaderLock, TaskScheduler
+
+LEASE = 0.3
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'leader.db'}", connect_args={"timeout": 30})
+    yield engine
+    engine.dispose()
+
+
+def test_exactly_one_instance_leads(engine):
+    first, second = LeaderLock(engine, "scheduler", LEASE), LeaderLock(engine, "scheduler", LEASE)
+
+    assert first.renew()
+    assert not second.renew()
+    assert first.renew()
+    assert (first.is_leader(), second.is_leader()) == (True, False)
+
+
+def test_other_instance_takes_over_after_lease_expires(engine):
+    first, second = LeaderLock(engine, "scheduler", LEASE), LeaderLock(engine, "scheduler", LEASE)
+    assert first.renew()
+
+    # Ведущий перестал продлевать аренду, например завис или упал
+    time.sleep(LEASE + 0.1)
+    assert second.renew()
+    assert not first.renew()
+    assert (first.is_leader(), second.is_leader()) == (False, True)
+
+
+def test_leadership_is_released_on_stop(engine):
+    first, second = LeaderLock(engine, "scheduler", 60), LeaderLock(engine, "scheduler", 60)
+    scheduler = TaskScheduler(workers=1, name="test-scheduler")
+    scheduler.set_leader(first, renew_seconds=60)
+    assert first.renew()
+    assert not second.renew()
+
+    scheduler.stop_all()
+
+    assert not first.is_leader()
+    # Аренда на минуту, но ждать ее истечения не нужно
+    assert second.renew()
@@ -0,0 +1,78 @@
+import logging
+import time
+from app.config import Config
+from app.utils import Lazy, Logger
+
+
+def test_invalid_level_falls_back_with_warning(monkeypatch):
+    monkeypatch.setattr(Config, "LOG_LEVELS", {"TestInvalidLevel": "VERBOSE"})
+    monkeypatch.setattr(Config, "LOG_LEVEL", "WARNING")
+    warnings = []
+    monkeypatch.setattr(Logger, "warn", lambda self, message, *args, **kwargs: warnings.append(message % args))
+
+    logger = Logger("TestInvalidLevel")
+
+    assert logger.level == logging.WARNING
+    assert warnings == ["Неизвестный уровень логов \"VERBOSE\" для TestInvalidLevel, используется WARNING"]
+
+
+def test_invalid_default_level_falls_back_to_info(monkeypatch):
+    monkeypatch.setattr(Config, "LOG_LEVELS", {})
+    monkeypatch.setattr(Config, "LOG_LEVEL", "LOUD")
+
+    assert Logger._resolve_level("Any", None) == (logging.INFO, ["LOUD"])
+
+
+def test_level_names_and_numbers_are_accepted(monkeypatch):
+    monkeypatch.setattr(Config, "LOG_LEVELS", {"Named": "debug", "Numeric": "30"})
+    monkeypatch.setattr(Config, "LOG_LEVEL", "INFO")
+
+    assert Logger._resolve_level("Named", None) == (logging.DEBUG, [])
+    assert Logger._resolve_level("Numeric", None) == (logging.WARNING, [])
+    assert Logger._resolve_level("Other", logging.ERROR) == (logging.ERROR, [])
+    assert Logger._resolve_level("Other", None) == (logging.INFO, [])
+
+
+def test_disabled_level_does_not_format_arguments(monkeypatch):
+    monkeypatch.setattr(Config, "LOG_LEVELS", {"TestQuietLogger": "WARNING"})
+    calls = []
+    logger = Logger("TestQuietLogger")
+
+    logger.debug("%s", Lazy(lambda: calls.append(1)))
+    assert calls == []
+
+
+def test_disabled_debug_costs_less_per_update_than_eager_formatting(monkeypatch):
+    monkeypatch.setattr(Config, "LOG_LEVELS", {"TestUpdateOverhead": "INFO"})
+    logger = Logger("TestUpdateOverhead")
+    keys = [{"text": f"Товар {index}", "callback_data": {"action": "select_order", "id": str(index)}}
+            for index in range(50)]
+    params = {"message_id": 42, "text": "Выберите товар", "reply_markup": keys, "user_id": 1, "chat_id": 1}
+    updates = 20_000
+
+    def fields(values):
+        return " ".join(f"{k}[{v}]" for k, v in reversed(values.items()) if k != "text")
+
+    def eager():
+        # Как было: строки собирались до проверки уровня
+        for name in ("YSContext.callback_handle", "YSContext.select_qty", "BaseContext.edit_message_text"):
+            logger.debug(f"Вызов функции {name}")
+        logger.debug(f"Выполнение команды EDIT_MESSAGE_TEXT: {fields(params)} text[\"{params['text']}\"]")
+        logger.debug(str(keys))
+
+    def lazy():
+        for name in ("YSContext.callback_handle", "YSContext.select_qty", "BaseContext.edit_message_text"):
+            logger.log_function_call(name)
+        logger.debug("Выполнение команды %s: %s text[\"%s\"]", "EDIT_MESSAGE_TEXT", Lazy(fields, params),
+                     params["text"])
+        logger.debug("%s", Lazy(str, keys))
+
+    timings = {}
+    for name, update in (("eager", eager), ("lazy", lazy)):
+        started = time.perf_counter()
+        for _ in range(updates):
+            update()
+        timings[name] = (time.perf_counter() - started) / updates
+
+    print(f"\nDEBUG off, per update: eager {timings['eager'] * 1e6:.2f} us, lazy {timings['lazy'] * 1e6:.2f} us")
+    assert timings["lazy"] * 5 < timings["eager"]
@@ -0,0 +1,74 @@
+from decimal import Decimal
+import pytest
+from sqlalchemy import event, update
+from app import db
+from app.models import Order, Product, StatusType, User
+
+
+@pytest.fixture
+def order(flask_app):
+    User(user_id=1, username="buyer").save()
+    product_id = Product(quantity=10, price=150).save().product_id
+    order = Order.priced(150, 2, "USDT", 3.5, user_id=1, product_id=product_id,
+                         invoice_id=100, message_id=200)
+    assert order.total_price == 300
+    order.save()
+    # После коммита атрибуты истекли; читаем их до подсчета запросов
+    db.session.refresh(order)
+    return order
+
+
+@pytest.fixture
+def statements(flask_app):
+    executed = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement.split()[0].upper())
+
+    event.listen(db.engine, "before_cursor_execute", count)
+    yield executed
+    event.remove(db.engine, "before_cursor_execute", count)
+
+
+def reload(order_id: int) -> Order:
+    db.session.expire_all()
+    return db.session.get(Order, order_id)
+
+
+def test_total_price_is_snapshot_of_order_time(order):
+    db.session.execute(update(Product).where(Product.product_id == order.product_id).values(price=999))
+    db.session.commit()
+
+    stored = reload(order.order_id)
+    assert stored.unit_price == 150
+    assert stored.total_price == Decimal("300.00")
+    assert stored.asset == "USDT"
+    assert stored.currency == "RUB"
+
+
+def test_transition_is_a_single_update(order, statements):
+    order_id = order.order_id
+    statements.clear()
+
+    assert Order.transition(order_id, StatusType.PAID)
+    assert statements == ["UPDATE"]
+
+    statements.clear()
+    assert not Order.transition(order_id, StatusType.CANCELLED)
+    assert statements == ["UPDATE"]
+
+    stored = reload(order_id)
+    assert stored.status == StatusType.PAID
+    assert stored.total_price == Decimal("300.00")
+
+
+def test_status_flush_does_not_select(order, statements):
+    loaded = reload(order.order_id)
+    loaded.total_price, loaded.status  # noqa: B018  загружаем строку до подсчета
+    statements.clear()
+
+    loaded.status = StatusType.DELIVERED
+    loaded.commit()
+    assert statements == ["UPDATE"]
+
+    assert reload(order.order_id).total_price == Decimal("300.00")
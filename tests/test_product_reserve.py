@@ -0,0 +1,79 @@
+import threading
+from app import db
+from app.models import Product
+
+INITIAL = 50
+THREADS = 8
+ATTEMPTS = 20
+
+
+def current_quantity(product_id):
+    db.session.expire_all()
+    return db.session.get(Product, product_id).quantity
+
+
+def test_reserve_never_oversells_under_concurrency(flask_app):
+    product_id = Product(quantity=INITIAL, price=100).save().product_id
+    start = threading.Barrier(THREADS)
+    reserved = []
+    errors = []
+
+    def buyer(amount):
+        with flask_app.app_context():
+            start.wait()
+            for _ in range(ATTEMPTS):
+                try:
+                    if Product.reserve(product_id, amount):
+                        reserved.append(amount)
+                except RuntimeError as e:
+                    errors.append(e)
+            db.session.remove()
+
+    threads = [threading.Thread(target=buyer, args=(1 + index % 3,)) for index in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    final = current_quantity(product_id)
+    assert final >= 0
+    # Каждый успешный резерв списан ровно один раз: ни потерянных, ни лишних списаний
+    assert final == INITIAL - sum(reserved)
+    # Покупатели по 1 шт. делают больше попыток, чем товара на складе, поэтому отказ при остатке — ошибка
+    assert final == 0
+
+
+def test_reserve_and_release_keep_quantity_consistent(flask_app):
+    product_id = Product(quantity=INITIAL, price=100).save().product_id
+    start = threading.Barrier(THREADS)
+    errors = []
+
+    def buyer():
+        with flask_app.app_context():
+            start.wait()
+            for _ in range(ATTEMPTS):
+                try:
+                    if Product.reserve(product_id, 2):
+                        Product.release(product_id, 2)
+                except RuntimeError as e:
+                    errors.append(e)
+            db.session.remove()
+
+    threads = [threading.Thread(target=buyer) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert current_quantity(product_id) == INITIAL
+
+
+def test_reserve_refuses_more_than_in_stock(flask_app):
+    product_id = Product(quantity=3, price=100).save().product_id
+
+    assert not Product.reserve(product_id, 4)
+    assert Product.reserve(product_id, 3)
+    assert not Product.reserve(product_id, 1)
+    assert current_quantity(product_id) == 0
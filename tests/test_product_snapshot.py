@@ -0,0 +1,53 @@
+import time
+import pytest
+from sqlalchemy import event
+from app import db
+from app.models import Product
+from app.utils import keyboard, product_snapshot
+
+
+@pytest.fixture
+def selects(flask_app):
+    executed = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            executed.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", count)
+    yield executed
+    event.remove(db.engine, "before_cursor_execute", count)
+
+
+@pytest.mark.parametrize("size", [5, 50, 500])
+def test_snapshot_loads_catalogue_in_one_query(flask_app, selects, size):
+    db.session.add_all(Product(quantity=index, price=100 + index, account_limit=1) for index in range(size))
+    db.session.commit()
+    db.session.expire_all()
+
+    # Прежний способ: один Product.query.get на товар
+    selects.clear()
+    started = time.perf_counter()
+    for product_id in range(1, size + 1):
+        db.session.get(Product, product_id)
+    per_product = time.perf_counter() - started
+    per_product_queries = len(selects)
+    db.session.expire_all()
+
+    product_snapshot.invalidate()
+    selects.clear()
+    started = time.perf_counter()
+    keyboard.update_inline_keyboard(Product)
+    batched = time.perf_counter() - started
+    print(f"\n{size} products: per-product {per_product_queries} queries {per_product * 1e3:.2f} ms, "
+          f"snapshot {len(selects)} query {batched * 1e3:.2f} ms")
+
+    assert per_product_queries == size
+    assert len(selects) == 1
+    assert len(product_snapshot.load(Product)) == size
+
+    # Пока снимок свеж, повторная отрисовка и чтение товаров не обращаются к БД
+    selects.clear()
+    keyboard.update_inline_keyboard(Product)
+    product_snapshot.get(Product, 1)
+    assert selects == []
@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import event
+from app import db
+from app.models import Product
+from app.utils import QuoteBook, product_snapshot
+from app.utils.rate_matrix import RateMatrix
+
+
+@pytest.fixture
+def quote_book(flask_app):
+    crypto_bot = SimpleNamespace(ensure_rates=lambda: True,
+                                 rate_matrix=RateMatrix.build([("RUB", "USDT", 0.01), ("RUB", "TON", 0.002)]))
+    book = QuoteBook(crypto_bot, Product)
+    product_snapshot.invalidate()
+    return book
+
+
+@pytest.fixture
+def statements(flask_app):
+    executed = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", count)
+    yield executed
+    event.remove(db.engine, "before_cursor_execute", count)
+
+
+def test_lookups_are_served_from_built_quotes(quote_book, statements):
+    product_id = Product(quantity=5, price=1000).save().product_id
+    assert quote_book.refresh()
+    statements.clear()
+
+    assert quote_book.get(product_id, 2, "USDT") == pytest.approx(20)
+    assert quote_book.get_for_assets(product_id, 3) == {"USDT": pytest.approx(30), "TON": pytest.approx(6)}
+    assert statements == []
+
+
+def test_stock_change_does_not_rebuild_quotes(quote_book):
+    product_id = Product(quantity=5, price=1000).save().product_id
+    assert quote_book.refresh()
+
+    Product.reserve(product_id, 1)
+    assert not quote_book.refresh()
+
+
+def test_missing_key_falls_back_to_rate_matrix(quote_book):
+    quote_book.refresh()
+    product_id = Product(quantity=5, price=500).save().product_id
+
+    assert quote_book.get(product_id, 1, "USDT") == pytest.approx(5)
+    assert quote_book.get_for_assets(product_id, 2) == {"USDT": pytest.approx(10), "TON": pytest.approx(2)}
+    assert quote_book.get(product_id + 100, 1, "USDT") is None
+
+
+def test_quote_built_for_old_price_is_not_used(quote_book):
+    product = Product(quantity=5, price=1000).save()
+    quote_book.refresh()
+    assert quote_book.get(product.product_id, 2, "USDT", price=1000) == pytest.approx(20)
+
+    # Цену изменили, а котировки еще не пересчитаны
+    product.price = 1500
+    db.session.commit()
+
+    assert quote_book.get(product.product_id, 2, "USDT", price=1500) == pytest.approx(30)
@@ -0,0 +1,110 @@
+import threading
+import time
+import pytest
+from app.utils.crypto_bot_api import RateLimiter, TokenBucket
+
+HOUR = 3600
+
+
+def test_token_bucket_burst_then_wait():
+    bucket = TokenBucket(capacity=3, rate=10)
+
+    assert [bucket.try_acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    wait = bucket.try_acquire()
+    assert 0 < wait <= 0.1
+
+    bucket.refund()
+    assert bucket.try_acquire() == 0.0
+
+
+def test_token_bucket_refund_does_not_exceed_capacity():
+    bucket = TokenBucket(capacity=2, rate=1 / HOUR)
+    bucket.refund()
+    assert bucket.tokens == pytest.approx(2)
+
+
+def test_method_budgets_are_separate():
+    limiter = RateLimiter(max_requests=100, window_seconds=HOUR,
+                          method_limits={"createInvoice": (2, HOUR), "getInvoices": (3, HOUR)})
+
+    assert [limiter.allow_request("createInvoice") for _ in range(3)] == [True, True, False]
+    assert [limiter.allow_request("getInvoices") for _ in range(4)] == [True, True, True, False]
+    # Методы без своего лимита ограничены только общим бюджетом
+    assert limiter.allow_request("getMe")
+    assert limiter.allow_request()
+
+
+def test_method_token_refunded_when_global_bucket_refuses():
+    limiter = RateLimiter(max_requests=1, window_seconds=HOUR, method_limits={"createInvoice": (5, HOUR)})
+    method_bucket = limiter.method_buckets["createInvoice"]
+
+    assert limiter.allow_request("createInvoice")
+    assert method_bucket.tokens == pytest.approx(4, abs=0.01)
+
+    assert not limiter.allow_request("createInvoice")
+    assert method_bucket.tokens == pytest.approx(4, abs=0.01)
+
+
+def test_blocking_waits_for_next_token():
+    limiter = RateLimiter(max_requests=1, window_seconds=0.2, block=True, max_wait_seconds=1)
+
+    assert limiter.allow_request()
+    started = time.monotonic()
+    assert limiter.allow_request()
+    assert 0.1 <= time.monotonic() - started < 1
+
+
+def test_blocking_gives_up_at_max_wait():
+    limiter = RateLimiter(max_requests=1, window_seconds=2, block=True, max_wait_seconds=0.3)
+
+    assert limiter.allow_request()
+    started = time.monotonic()
+    # Следующий токен через ~2 с, дольше max_wait_seconds: отказ без ожидания впустую
+    assert not limiter.allow_request()
+    assert time.monotonic() - started < 0.3
+
+    assert not limiter.allow_request(block=False)
+
+
+def test_thread_safety_under_contention():
+    limiter = RateLimiter(max_requests=100, window_seconds=HOUR, method_limits={"getInvoices": (60, HOUR)})
+    threads_count, attempts = 16, 20
+    start = threading.Barrier(threads_count)
+    allowed = []
+    lock = threading.Lock()
+
+    def worker(method):
+        start.wait()
+        granted = sum(limiter.allow_request(method) for _ in range(attempts))
+        with lock:
+            allowed.append((method, granted))
+
+    threads = [threading.Thread(target=worker, args=("getInvoices" if index % 2 else None,))
+               for index in range(threads_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    per_method = sum(granted for method, granted in allowed if method == "getInvoices")
+    total = sum(granted for _, granted in allowed)
+    assert per_method <= 60
+    assert total == 100
+
+
+def test_throughput_stays_constant_as_history_grows():
+    # Старый лимитер пересобирал список запросов за окно: чем больше запросов, тем дороже проверка
+    calls, chunk = 100_000, 10_000
+    limiter = RateLimiter(max_requests=calls, window_seconds=HOUR, method_limits={"getInvoices": (calls, HOUR)})
+
+    timings = []
+    for _ in range(calls // chunk):
+        started = time.perf_counter()
+        for _ in range(chunk):
+            limiter.allow_request("getInvoices")
+        timings.append(time.perf_counter() - started)
+
+    total = sum(timings)
+    print(f"\n{calls} allow_request: {calls / total:,.0f} ops/s, "
+          f"first {chunk}: {timings[0] * 1e6 / chunk:.2f} us/call, last {chunk}: {timings[-1] * 1e6 / chunk:.2f} us/call")
+    assert timings[-1] < timings[0] * 3
@@ -0,0 +1,45 @@
+import pytest
+from app.utils.rate_matrix import RateMatrix
+
+PAIRS = [
+    ("USD", "RUB", 90.0),
+    ("TON", "USD", 5.0),
+    ("USDT", "USD", 1.0),
+    ("BTC", "EUR", 60000.0),
+]
+
+
+@pytest.fixture
+def matrix():
+    return RateMatrix.build(PAIRS)
+
+
+def test_direct_rate(matrix):
+    assert matrix.rate("USD", "RUB") == 90.0
+    assert matrix.convert(2, "TON", "USD") == 10.0
+
+
+def test_inverse_rate(matrix):
+    assert matrix.rate("RUB", "USD") == pytest.approx(1 / 90)
+    assert matrix.rate("USD", "TON") == pytest.approx(0.2)
+
+
+def test_direct_rate_wins_over_inverse():
+    matrix = RateMatrix.build([("USD", "RUB", 90.0), ("RUB", "USD", 0.0125)])
+    assert matrix.rate("RUB", "USD") == 0.0125
+
+
+def test_cross_rate_through_pivot(matrix):
+    # RUB -> USD -> TON
+    assert matrix.rate("RUB", "TON") == pytest.approx(1 / 90 / 5)
+    assert matrix.convert(450, "RUB", "TON") == pytest.approx(1.0)
+    assert matrix.convert_many({"order": 900}, "RUB", ["TON", "USDT"]) == {
+        "order": {"TON": pytest.approx(2.0), "USDT": pytest.approx(10.0)}}
+
+
+def test_missing_pair(matrix):
+    # BTC/EUR не связаны с опорными валютами
+    assert matrix.rate("RUB", "BTC") is None
+    assert matrix.convert(100, "EUR", "TON") is None
+    assert matrix.rate("RUB", "XMR") is None
+    assert RateMatrix.empty().rate("USD", "RUB") is None
@@ -0,0 +1,54 @@
+import threading
+import time
+import tracemalloc
+from types import SimpleNamespace
+import pytest
+from app.bot.contexts.bot_context import YSContext
+from app.models import User
+from app.utils import CryptoBotAPI, TaskScheduler
+
+USERS = 100
+UPDATES = 10_000
+
+
+def make_update(user_id: int):
+    sender = SimpleNamespace(id=user_id, username=f"user{user_id}")
+    return SimpleNamespace(message=SimpleNamespace(from_user=sender, chat_id=user_id), callback_query=None)
+
+
+@pytest.fixture
+def shared_client(flask_app):
+    scheduler = TaskScheduler(workers=1, name="test-scheduler")
+    flask_app.crypto_bot = CryptoBotAPI(scheduler=scheduler)
+    for user_id in range(1, USERS + 1):
+        User(user_id=user_id, username=f"user{user_id}").save()
+    yield flask_app.crypto_bot
+    scheduler.stop_all()
+
+
+def test_contexts_reuse_one_client_with_flat_threads_and_memory(shared_client):
+    for user_id in range(1, USERS + 1):
+        YSContext(make_update(user_id))
+
+    threads_before = threading.active_count()
+    tracemalloc.start()
+    memory_before, _ = tracemalloc.get_traced_memory()
+    started = time.perf_counter()
+
+    clients = set()
+    for index in range(UPDATES):
+        context = YSContext(make_update(index % USERS + 1))
+        clients.add(id(context.crypto_bot))
+        del context
+
+    elapsed = time.perf_counter() - started
+    memory_after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    threads_after = threading.active_count()
+    print(f"\n{UPDATES} updates: {elapsed * 1e6 / UPDATES:.1f} us/update, "
+          f"threads {threads_before}->{threads_after}, memory +{(memory_after - memory_before) / 1024:.1f} KiB")
+
+    assert clients == {id(shared_client)}
+    assert threads_after == threads_before
+    # Новый клиент на обновление стоил бы кэш, лимитер и поток; здесь рост — только шум аллокатора
+    assert memory_after - memory_before < 256 * 1024
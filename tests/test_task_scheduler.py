@@ -0,0 +1,108 @@
+import logging
+import resource
+import threading
+import time
+import tracemalloc
+from app.utils import CryptoBotAPI, TaskScheduler
+
+
+class CountingLeader:
+    """Лидерство без БД: считает продления"""
+
+    def __init__(self):
+        self.renewals = 0
+
+    def renew(self):
+        self.renewals += 1
+        return True
+
+    def is_leader(self):
+        return True
+
+    def release(self):
+        pass
+
+
+def wait_until(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_leader_renewal_is_not_starved_by_busy_workers():
+    scheduler = TaskScheduler(workers=2, oneshot_workers=2, name="test-scheduler")
+    release = threading.Event()
+    try:
+        for index in range(4):
+            scheduler.start_task(release.wait, 60, task_id=f"slow-{index}")
+        for index in range(50):
+            scheduler.schedule_once(release.wait, 0, f"expiry-{index}")
+
+        leader = CountingLeader()
+        scheduler.set_leader(leader, renew_seconds=0.05)
+        assert wait_until(lambda: leader.renewals >= 4)
+    finally:
+        release.set()
+        scheduler.stop_all()
+
+
+def test_one_shot_tasks_do_not_block_periodic_tasks():
+    scheduler = TaskScheduler(workers=1, oneshot_workers=1, name="test-scheduler")
+    release = threading.Event()
+    ticks = []
+    try:
+        for index in range(10):
+            scheduler.schedule_once(release.wait, 0, f"expiry-{index}")
+        scheduler.start_task(lambda: ticks.append(1), 0.05, task_id="tick")
+        assert wait_until(lambda: len(ticks) >= 2)
+    finally:
+        release.set()
+        scheduler.stop_all()
+
+
+def test_schedule_once_runs_once_and_cancel_drops_it():
+    scheduler = TaskScheduler(workers=1, name="test-scheduler")
+    runs = []
+    try:
+        scheduler.schedule_once(runs.append, 0.05, "once", "a")
+        scheduler.schedule_once(runs.append, 0.05, "cancelled", "b")
+        assert scheduler.cancel("cancelled")
+        assert wait_until(lambda: runs == ["a"])
+        time.sleep(0.1)
+        assert runs == ["a"]
+        assert "once" not in scheduler.task_ids()
+    finally:
+        scheduler.stop_all()
+
+
+def test_pending_invoice_expiries_share_one_timer_thread(monkeypatch):
+    # Раньше каждый инвойс держал свой threading.Timer: 50k инвойсов — 50k спящих потоков
+    pending = 50_000
+    # pytest держит перехваченные записи лога в памяти, в замер они попасть не должны
+    monkeypatch.setattr(logging.getLogger("CryptoBotAPI"), "disabled", True)
+    scheduler = TaskScheduler(workers=1, oneshot_workers=2, name="test-scheduler")
+    manager = CryptoBotAPI(scheduler=scheduler).invoice_manager
+    threads_before = threading.active_count()
+    tracemalloc.start()
+    try:
+        started = time.perf_counter()
+        for invoice_id in range(pending):
+            manager.add_invoice({"invoice_id": invoice_id, "hash": f"IV{invoice_id}", "status": "active"}, auto_cancel_seconds=3600)
+        elapsed = time.perf_counter() - started
+        memory, _ = tracemalloc.get_traced_memory()
+        threads = threading.active_count()
+        rss_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+        print(f"\n{pending} pending invoices: threads {threads_before} -> {threads}, "
+              f"+{memory / 1024 / 1024:.1f} MiB traced, {memory / pending:.0f} B/invoice, "
+              f"peak RSS {rss_mib:.0f} MiB, {elapsed * 1e6 / pending:.1f} us/add")
+        assert threads <= threads_before + 1
+        assert memory / pending < 2048
+
+        for invoice_id in range(pending):
+            manager.remove_invoice(invoice_id)
+        assert scheduler.task_ids() == ["invoice_poll"]
+    finally:
+        tracemalloc.stop()
+        scheduler.stop_all()
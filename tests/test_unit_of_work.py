@@ -0,0 +1,70 @@
+import time
+import pytest
+from sqlalchemy import event
+from app import db
+from app.models import Base, Order, Product, User, choice_store
+
+PURCHASES = 200
+
+
+@pytest.fixture
+def commits(flask_app):
+    counted = []
+
+    def count(conn):
+        counted.append(1)
+
+    event.listen(db.engine, "commit", count)
+    yield counted
+    event.remove(db.engine, "commit", count)
+
+
+def purchase(product_id: int, invoice_id: int):
+    """Шаги set_order: резерв, заказ и выбор валюты"""
+    Product.reserve(product_id, 1)
+    Order.priced(100, 1, "USDT", 1.25, user_id=1, product_id=product_id,
+                 invoice_id=invoice_id, message_id=invoice_id).save()
+    choice_store.set_stage(1, 3, 1)
+
+
+def test_purchase_is_one_commit(flask_app, commits):
+    User(user_id=1, username="buyer").save()
+    product_id = Product(quantity=2 * PURCHASES, price=100).save().product_id
+
+    commits.clear()
+    started = time.perf_counter()
+    for invoice_id in range(PURCHASES):
+        purchase(product_id, invoice_id)
+    separate = time.perf_counter() - started
+    separate_commits = len(commits)
+
+    commits.clear()
+    started = time.perf_counter()
+    for invoice_id in range(PURCHASES, 2 * PURCHASES):
+        with Base.unit_of_work():
+            purchase(product_id, invoice_id)
+    grouped = time.perf_counter() - started
+
+    print(f"\n{PURCHASES} purchases: {separate_commits / PURCHASES:.0f} commits, "
+          f"{separate * 1e3 / PURCHASES:.2f} ms each without unit of work; "
+          f"{len(commits) / PURCHASES:.0f} commit, {grouped * 1e3 / PURCHASES:.2f} ms each with it")
+    assert separate_commits == 3 * PURCHASES
+    assert len(commits) == PURCHASES
+    assert Order.query.count() == 2 * PURCHASES
+
+
+def test_rollback_drops_every_step_and_outbox(flask_app, commits):
+    User(user_id=1, username="buyer").save()
+    product_id = Product(quantity=5, price=100).save().product_id
+    sent = []
+
+    with pytest.raises(RuntimeError):
+        with Base.unit_of_work() as uow:
+            purchase(product_id, 1)
+            uow.after_commit(sent.append, "delete invoice")
+            raise RuntimeError("invoice creation failed")
+
+    db.session.expire_all()
+    assert db.session.get(Product, product_id).quantity == 5
+    assert Order.query.count() == 0
+    assert sent == []
@@ -0,0 +1,113 @@
+import threading
+import time
+from types import SimpleNamespace
+from app.utils import UpdateQueue
+
+
+def make_update(user_id, update_id, **extra):
+    return SimpleNamespace(effective_user=SimpleNamespace(id=user_id), update_id=update_id, **extra)
+
+
+def test_updates_of_one_user_run_in_order():
+    seen = []
+    lock = threading.Lock()
+
+    def handler(update):
+        time.sleep(0.001)
+        with lock:
+            seen.append((update.effective_user.id, update.update_id))
+
+    updates = UpdateQueue(handler, workers=4, maxsize=1000)
+    updates.start()
+    for update_id in range(200):
+        assert updates.put(make_update(update_id % 5, update_id))
+    updates.stop(timeout=10)
+
+    assert len(seen) == 200
+    for user_id in range(5):
+        own = [update_id for user, update_id in seen if user == user_id]
+        assert own == sorted(own)
+
+
+def test_slow_update_blocks_only_its_user():
+    release = threading.Event()
+    done = []
+
+    def handler(update):
+        if update.slow:
+            release.wait(5)
+        done.append(update.update_id)
+
+    # Пользователи 0 и 4 попадали бы в одну полосу при user_id % workers
+    updates = UpdateQueue(handler, workers=4, maxsize=100)
+    updates.start()
+    updates.put(make_update(0, 1, slow=True))
+    updates.put(make_update(4, 2, slow=False))
+    updates.put(make_update(0, 3, slow=False))
+
+    deadline = time.monotonic() + 2
+    while 2 not in done and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert done == [2]
+
+    release.set()
+    updates.stop(timeout=5)
+    assert done == [2, 1, 3]
+
+
+def test_put_rejects_when_full():
+    release = threading.Event()
+    updates = UpdateQueue(lambda update: release.wait(5), workers=1, maxsize=2, enqueue_timeout=0.05)
+    updates.start()
+    updates.put(make_update(1, 1))
+    deadline = time.monotonic() + 2
+    while updates.stats()["depth"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert updates.put(make_update(1, 2))
+    assert updates.put(make_update(2, 3))
+    assert not updates.put(make_update(3, 4))
+    assert updates.stats()["rejected"] == 1
+
+    release.set()
+    updates.stop(timeout=5)
+    assert updates.stats()["processed"] == 3
+    assert not updates.put(make_update(1, 5))
+
+
+def test_stress_interleaved_callbacks_keep_choices_intact():
+    users, steps = 200, 3
+    stages = ("select_order", "select_qty", "select_asset")
+    choices = {}
+    running = set()
+    overlaps = []
+    lock = threading.Lock()
+
+    def handler(update):
+        user_id = update.effective_user.id
+        with lock:
+            if user_id in running:
+                overlaps.append(user_id)
+            running.add(user_id)
+        # Чтение и запись выбора разнесены, как в choice_update: гонка испортила бы строку
+        choice = choices.get(user_id, "")
+        time.sleep(0.0005)
+        choices[user_id] = choice + f"{stages[update.step]}?{update.value}/"
+        with lock:
+            running.discard(user_id)
+
+    updates = UpdateQueue(handler, workers=8, maxsize=users * steps)
+    updates.start()
+    started = time.perf_counter()
+    for step in range(steps):
+        for user_id in range(users):
+            assert updates.put(make_update(user_id, step * users + user_id, step=step, value=user_id % 7 + step))
+    updates.stop(timeout=30)
+    elapsed = time.perf_counter() - started
+    print(f"\n{users * steps} callbacks for {users} users: {users * steps / elapsed:.0f} updates/s")
+
+    assert overlaps == []
+    assert updates.stats()["processed"] == users * steps
+    for user_id in range(users):
+        expected = "".join(f"{stages[step]}?{user_id % 7 + step}/" for step in range(steps))
+        assert choices[user_id] == expected